@@ -1,18 +1,44 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, Response
+from flask import Flask, render_template, request, jsonify, send_file, session, Response, stream_with_context, g
 from datetime import datetime, timedelta
+import logging
 import os
+import time
 from dotenv import load_dotenv
-from functions.api_tools import get_exchange_rate, get_crypto_price
-from functions.db_tools import log_transaction, get_monthly_summary, get_spending_by_category
-from functions.file_tools import import_transactions_from_csv, export_summary_to_pdf, export_data_to_csv
-from llm.agent import process_user_message
+from functions.api_tools import get_exchange_rate, get_exchange_rate_cache_stats
+from functions.market_data import (
+    CRYPTO_POLLER_ENABLED,
+    start_market_data_poller,
+    get_latest_crypto_price,
+    get_latest_crypto_prices
+)
+from functions.db_tools import log_transaction, get_monthly_summary, get_spending_by_category, init_db, remove_session
+from functions.file_tools import (
+    import_transactions_from_csv,
+    export_summary_to_pdf,
+    export_data_to_csv,
+    stream_transactions_csv,
+    purge_old_exports
+)
+from functions.jobs import JobQueue, QueueFullError
+from functions.log_tools import configure_logging
+from functions.metrics import RequestStats, current_request_stats, observe_request, render_prometheus
+from llm.profiler import trace_store
 import uuid
+import json
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Requests slower than this many seconds are logged as warnings
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '1.0'))
+
 app = Flask(__name__)
 
+# Release the request's database session when the request ends
+app.teardown_appcontext(remove_session)
+
 # Set a consistent secret key from environment or generate one
 if os.path.exists('.flask_secret_key'):
     with open('.flask_secret_key', 'rb') as f:
@@ -28,9 +54,92 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=31)  # Sessions last for 31 days
 
-# Ensure the uploads and exports directories exist
-os.makedirs('uploads', exist_ok=True)
-os.makedirs('exports', exist_ok=True)
+# Background chat processing (see CHAT_* settings in .env)
+chat_jobs = JobQueue(
+    'chat',
+    max_workers=int(os.getenv('CHAT_WORKERS', '4')),
+    max_pending=int(os.getenv('CHAT_QUEUE_SIZE', '16')),
+    retention=float(os.getenv('CHAT_JOB_RETENTION', '600'))
+)
+
+# Background report generation (see EXPORT_* settings in .env)
+export_jobs = JobQueue(
+    'export',
+    max_workers=int(os.getenv('EXPORT_WORKERS', '2')),
+    max_pending=int(os.getenv('EXPORT_QUEUE_SIZE', '8')),
+    retention=float(os.getenv('EXPORT_JOB_RETENTION', '3600'))
+)
+# Generated files in exports/ older than this many seconds are deleted
+EXPORT_FILE_RETENTION = float(os.getenv('EXPORT_FILE_RETENTION', str(24 * 3600)))
+
+_app_initialized = False
+
+def create_app() -> Flask:
+    """
+    Prepare the application for serving: create the working directories, create or
+    upgrade the database and start background services. Safe to call more than once.
+    WSGI servers should load the app with this factory, e.g. gunicorn "app:create_app()".
+    """
+    global _app_initialized
+    if _app_initialized:
+        return app
+
+    configure_logging()
+
+    # Ensure the uploads and exports directories exist (the routes writing to them also create them on use)
+    os.makedirs('uploads', exist_ok=True)
+    os.makedirs('exports', exist_ok=True)
+
+    init_db()
+
+    # Keep hot crypto prices in memory (see CRYPTO_* settings in .env)
+    if CRYPTO_POLLER_ENABLED:
+        start_market_data_poller()
+
+    _app_initialized = True
+    return app
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.request_stats = RequestStats()
+    g.request_stats_token = current_request_stats.set(g.request_stats)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    # Streamed responses are measured up to the first chunk
+    duration = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    stats = g.get('request_stats')
+    observe_request(request.method, route, response.status_code, duration, stats)
+
+    fields = {
+        'method': request.method,
+        'route': route,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'db_queries': stats.queries if stats else 0,
+        'db_time_ms': round(stats.query_seconds * 1000, 1) if stats else 0
+    }
+    if duration >= SLOW_REQUEST_SECONDS:
+        logger.warning("Slow request", extra=fields)
+    else:
+        logger.debug("Request handled", extra=fields)
+    return response
+
+@app.teardown_request
+def reset_request_stats(exception=None):
+    token = g.pop('request_stats_token', None)
+    if token is not None:
+        current_request_stats.reset(token)
+
+@app.route('/metrics')
+def metrics():
+    """Request, database, upstream and tool latency histograms in Prometheus text format"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 def get_or_create_user_id():
     if 'user_id' not in session:
@@ -80,6 +189,8 @@ def import_csv():
             return jsonify({'success': False, 'error': 'No file selected'})
         
         if file and file.filename.endswith('.csv'):
+            # Also created here for entry points that skip create_app() (flask run, gunicorn app:app)
+            os.makedirs('uploads', exist_ok=True)
             filepath = os.path.join('uploads', file.filename)
             file.save(filepath)
             success = import_transactions_from_csv(user_id, filepath)
@@ -107,11 +218,82 @@ def export_pdf():
 @app.route('/api/export_csv')
 def export_csv():
     user_id = get_or_create_user_id()
+    if request.args.get('stream') == '1':
+        # Stream rows straight from the database instead of building a file first
+        filename = f'transactions_{user_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        return Response(
+            stream_transactions_csv(user_id),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
     filename = export_data_to_csv(user_id)
     if filename:
         return send_file(filename, as_attachment=True)
     return jsonify({'success': False, 'error': 'Failed to export CSV'})
 
+def run_export_job(export_type: str, user_id: str, month: int, year: int) -> str:
+    try:
+        if export_type == 'pdf':
+            filename = export_summary_to_pdf(user_id, month, year)
+        else:
+            filename = export_data_to_csv(user_id)
+        if not filename:
+            raise RuntimeError(f'Failed to generate {export_type.upper()}')
+        # The job record is read back by whichever worker serves the download
+        return os.path.abspath(filename)
+    finally:
+        # Job threads get their own database session, release it
+        remove_session()
+
+@app.route('/api/export_jobs', methods=['POST'])
+def submit_export_job():
+    """Queue a PDF or CSV export and return its job id"""
+    user_id = get_or_create_user_id()
+    data = request.get_json(silent=True) or request.form
+    export_type = data.get('type', 'pdf')
+    if export_type not in ('pdf', 'csv'):
+        return jsonify({'success': False, 'error': 'type must be pdf or csv'}), 400
+    month = int(data.get('month', datetime.now().month))
+    year = int(data.get('year', datetime.now().year))
+
+    purge_old_exports(EXPORT_FILE_RETENTION)
+    try:
+        job_id = export_jobs.submit(user_id, run_export_job, export_type, user_id, month, year)
+    except QueueFullError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': '5'}
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/export_jobs/{job_id}'
+    }), 202
+
+@app.route('/api/export_jobs/<job_id>')
+def get_export_job(job_id):
+    """Get the status of an export job and its download link once done"""
+    user_id = get_or_create_user_id()
+    job = export_jobs.get(job_id, owner=user_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    result = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == 'done':
+        result['download_url'] = f'/api/export_jobs/{job_id}/download'
+    elif job['status'] == 'failed':
+        result['error'] = job['error']
+    return jsonify(result)
+
+@app.route('/api/export_jobs/<job_id>/download')
+def download_export(job_id):
+    user_id = get_or_create_user_id()
+    job = export_jobs.get(job_id, owner=user_id)
+    if job is None or job['status'] != 'done':
+        return jsonify({'success': False, 'error': 'Export not ready'}), 404
+    if not os.path.exists(job['result']):
+        return jsonify({'success': False, 'error': 'Export has expired, please generate it again'}), 410
+    return send_file(job['result'], as_attachment=True)
+
 @app.route('/exchange_rates')
 def exchange_rates():
     return render_template('exchange_rates.html')
@@ -123,6 +305,10 @@ def get_rate():
     rate = get_exchange_rate(base, target)
     return jsonify({'rate': rate})
 
+@app.route('/api/exchange_rate/cache_stats')
+def get_rate_cache_stats():
+    return jsonify(get_exchange_rate_cache_stats())
+
 @app.route('/crypto')
 def crypto():
     return render_template('crypto.html')
@@ -130,9 +316,15 @@ def crypto():
 @app.route('/api/crypto_price')
 def get_crypto():
     symbol = request.args.get('symbol', 'BTC')
-    price = get_crypto_price(symbol)
+    price = get_latest_crypto_price(symbol)
     return jsonify(price)
 
+@app.route('/api/crypto_prices')
+def get_cryptos():
+    symbols = request.args.get('symbols', 'BTC').split(',')
+    prices = get_latest_crypto_prices(symbols)
+    return jsonify(prices)
+
 @app.route('/chat')
 def chat():
     user_id = get_or_create_user_id()
@@ -142,9 +334,75 @@ def chat():
 def process_chat():
     user_id = get_or_create_user_id()
     message = request.json.get('message', '')
+    # Imported on first use so workers that never chat don't load the OpenAI client
+    from llm.agent import process_user_message
     response = process_user_message(user_id, message)
     return jsonify({'response': response})
 
+def run_chat_job(user_id: str, message: str) -> str:
+    from llm.agent import process_user_message
+    return process_user_message(user_id, message)
+
+@app.route('/api/chat/jobs', methods=['POST'])
+def submit_chat_job():
+    """Queue a chat message for background processing and return its job id"""
+    user_id = get_or_create_user_id()
+    message = request.json.get('message', '')
+    try:
+        job_id = chat_jobs.submit(user_id, run_chat_job, user_id, message)
+    except QueueFullError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': '2'}
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/chat/jobs/{job_id}'
+    }), 202
+
+@app.route('/api/chat/jobs/<job_id>')
+def get_chat_job(job_id):
+    """Get the status of a queued chat message and its response once done"""
+    user_id = get_or_create_user_id()
+    job = chat_jobs.get(job_id, owner=user_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    result = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == 'done':
+        result['response'] = job['result']
+    elif job['status'] == 'failed':
+        result['error'] = job['error']
+    return jsonify(result)
+
+@app.route('/api/chat/stream', methods=['POST'])
+def stream_chat():
+    """Stream the assistant's reply as server-sent events while it is generated"""
+    user_id = get_or_create_user_id()
+    message = request.json.get('message', '')
+    from llm.agent import stream_user_message
+
+    def generate():
+        for event in stream_user_message(user_id, message):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/llm/traces/summary')
+def llm_trace_summary():
+    """Token usage, model latency and tool time aggregated over the recent chat turns"""
+    return jsonify(trace_store.summary())
+
+@app.route('/api/llm/traces')
+def llm_traces():
+    """The current user's most recent chat turn traces, newest first"""
+    user_id = get_or_create_user_id()
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    return jsonify(trace_store.recent(limit, user_id=user_id))
+
 @app.route('/api/csv_template')
 def get_csv_template():
     """Provide a downloadable CSV template with examples in different formats"""
@@ -172,4 +430,4 @@ def get_csv_template():
     )
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    create_app().run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Micro-benchmarks for the application's hot paths at several data sizes.
+
+Runs against a throwaway SQLite database in a temporary directory, with the
+external APIs replaced by the local stubs from stub_servers.py, so no network
+access or API keys are needed. Results are printed as a table and can be
+written as JSON; with --baseline, each result is compared to an earlier run:
+
+    python benchmarks/hot_paths.py --sizes 100,1000,10000 --json bench.json
+    python benchmarks/hot_paths.py --baseline bench.json --max-regression 0.25
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_servers import EXCHANGE_RATES, start_stub_servers, stop_stub_servers, stub_environment
+
+CURRENCIES = ['USD', 'USD', 'USD', 'EUR', 'GBP']
+CATEGORIES = ['food', 'transport', 'utilities', 'entertainment', 'shopping', 'other']
+CHAT_MESSAGES = [
+    "Show me my monthly summary",
+    "I spent 12.50 eur on food today",
+    "What's the USD to EUR rate?",
+    "Thanks!"
+]
+
+def make_transactions(user_id: str, count: int, rng: random.Random) -> list:
+    """Random transactions spread over the current month"""
+    today = date.today()
+    return [{
+        'user_id': user_id,
+        'amount': round(rng.uniform(1, 500), 2),
+        'currency': rng.choice(CURRENCIES),
+        'category': rng.choice(CATEGORIES),
+        'type': 'income' if rng.random() < 0.1 else 'expense',
+        'date': today.replace(day=rng.randint(1, today.day))
+    } for _ in range(count)]
+
+def seed_exchange_rates(days: int) -> None:
+    """
+    Store the stub's rates for every day of the last `days` days, as a rate file backfill
+    would, so conversions are served from the rate table instead of the live fallback
+    """
+    from functions.db_tools import store_usd_rates
+
+    today = date.today()
+    store_usd_rates(
+        (today - timedelta(days=offset), currency, 1 / per_usd)
+        for offset in range(days + 1)
+        for currency, per_usd in EXCHANGE_RATES.items()
+        if currency != 'USD'
+    )
+
+def write_import_csv(path: str, transactions: list) -> None:
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date', 'amount_usd', 'original_amount', 'original_currency', 'category', 'type'])
+        for trans in transactions:
+            writer.writerow([trans['date'].isoformat(), trans['amount'], trans['amount'],
+                             trans['currency'], trans['category'], trans['type']])
+
+def summarize(name: str, size: int, timings: list, per_row: bool = False) -> dict:
+    """Timing statistics of one benchmark, in milliseconds; per_row adds the row throughput"""
+    median = statistics.median(timings)
+    return {
+        'benchmark': name,
+        'size': size,
+        'runs': len(timings),
+        'median_ms': round(median * 1000, 3),
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'min_ms': round(min(timings) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+        'rows_per_second': round(size / median, 1) if per_row and median else None
+    }
+
+def measure(fn, repeat: int, setup=None) -> list:
+    """Time fn() `repeat` times, calling setup() (untimed) before each run"""
+    timings = []
+    for run in range(repeat):
+        argument = setup(run) if setup else None
+        start = time.perf_counter()
+        result = fn(argument) if setup else fn()
+        timings.append(time.perf_counter() - start)
+        if result in (None, False):
+            raise RuntimeError(f"Benchmarked call returned {result!r}")
+    return timings
+
+def run_benchmarks(sizes: list, repeat: int, seed: int) -> list:
+    # Imported here so they pick up the stub and database settings from the environment
+    from functions.db_tools import init_db, bulk_insert_transactions, get_monthly_summary, remove_session
+    from functions.file_tools import import_transactions_from_csv, export_data_to_csv, export_summary_to_pdf, PDF_CACHE_DIR
+    from llm.agent import process_user_message
+
+    init_db()
+    rng = random.Random(seed)
+    today = date.today()
+    seed_exchange_rates(today.day)
+    results = []
+
+    for size in sizes:
+        print(f"size {size}...", file=sys.stderr)
+
+        # Writes get a fresh user per run so every run inserts into the same starting state
+        def bulk_setup(run):
+            return make_transactions(f'bench_bulk_{size}_{run}', size, rng)
+        results.append(summarize('bulk_insert_transactions', size,
+                                 measure(bulk_insert_transactions, repeat, bulk_setup), per_row=True))
+
+        def import_setup(run):
+            path = f'import_{size}_{run}.csv'
+            write_import_csv(path, make_transactions(None, size, rng))
+            return f'bench_import_{size}_{run}', path
+        results.append(summarize('import_transactions_from_csv', size,
+                                 measure(lambda args: import_transactions_from_csv(*args), repeat, import_setup), per_row=True))
+
+        # Reads all use the first bulk-inserted user, which has `size` transactions this month
+        user_id = f'bench_bulk_{size}_0'
+        results.append(summarize('get_monthly_summary', size,
+                                 measure(lambda: get_monthly_summary(user_id, today.month, today.year), repeat)))
+        results.append(summarize('export_data_to_csv', size,
+                                 measure(lambda: export_data_to_csv(user_id), repeat), per_row=True))
+
+        def clear_pdf_cache(run):
+            shutil.rmtree(PDF_CACHE_DIR, ignore_errors=True)
+        results.append(summarize('export_summary_to_pdf', size,
+                                 measure(lambda _: export_summary_to_pdf(user_id, today.month, today.year), repeat, clear_pdf_cache)))
+        results.append(summarize('export_summary_to_pdf_cached', size,
+                                 measure(lambda: export_summary_to_pdf(user_id, today.month, today.year), repeat)))
+
+        for message in CHAT_MESSAGES:
+            results.append({
+                **summarize('process_user_message', size, measure(lambda: process_user_message(user_id, message), repeat)),
+                'message': message
+            })
+        remove_session()
+
+    return results
+
+def display_name(result: dict) -> str:
+    return result['benchmark'] + (f" [{result['message'][:12]}]" if result.get('message') else '')
+
+def result_key(result: dict) -> tuple:
+    return result['benchmark'], result['size'], result.get('message')
+
+def compare(results: list, baseline: list, max_regression: float) -> list:
+    """Print the change against a baseline run and return the results that slowed down more than allowed"""
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    print(f"\n{'benchmark':<34}{'size':>8}{'baseline':>12}{'current':>12}{'change':>9}")
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None or not before['median_ms']:
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        flag = '  <-- regression' if change > max_regression else ''
+        print(f"{display_name(result):<34}{result['size']:>8}{before['median_ms']:>10.2f}ms"
+              f"{result['median_ms']:>10.2f}ms{change:>+8.0%}{flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help="Comma-separated transaction counts")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark and size")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency', type=float, default=0.0, help="Milliseconds added by the exchange rate and Binance stubs")
+    parser.add_argument('--openai-latency', type=float, default=0.0, help="Milliseconds added by the OpenAI stub")
+    parser.add_argument('--json', help="Write results to this file")
+    parser.add_argument('--baseline', help="Earlier --json output to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="With --baseline, exit with status 1 if a median is this fraction slower")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    servers = start_stub_servers(latency=args.latency / 1000, openai_latency=args.openai_latency / 1000, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix='finance-bench-')
+    cwd = os.getcwd()
+    try:
+        os.environ.update(stub_environment(servers))
+        os.environ.update({
+            'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            'CRYPTO_POLLER_ENABLED': 'false'
+        })
+        os.chdir(workdir)  # exports/ and the PDF cache are relative to the working directory
+        results = run_benchmarks(sizes, args.repeat, args.seed)
+    finally:
+        os.chdir(cwd)
+        stop_stub_servers(servers)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'benchmark':<34}{'size':>8}{'median':>12}{'min':>12}{'rows/s':>12}")
+    for result in results:
+        rows_per_second = f"{result['rows_per_second']:>12,.0f}" if result['rows_per_second'] else f"{'':>12}"
+        print(f"{display_name(result):<34}{result['size']:>8}{result['median_ms']:>10.2f}ms{result['min_ms']:>10.2f}ms{rows_per_second}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'stub_latency_ms': args.latency,
+            'stub_openai_latency_ms': args.openai_latency
+        },
+        'results': results
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
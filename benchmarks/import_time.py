@@ -0,0 +1,86 @@
+"""
+Measure cold-start import time of the application modules.
+
+Each module is imported in a fresh interpreter several times and the median
+wall time is reported. With --ref, the same measurement is run against another
+git revision (exported to a temporary directory) for comparison, e.g.:
+
+    python benchmarks/import_time.py --ref HEAD~1 --json import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['app', 'functions.db_tools', 'functions.file_tools', 'llm.agent']
+
+IMPORT_SNIPPET = """
+import time, warnings
+warnings.simplefilter('ignore')
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+def time_import(source_root: str, module: str, repeat: int) -> list:
+    """Import a module `repeat` times in fresh interpreters and return the timings in seconds"""
+    env = dict(os.environ, PYTHONPATH=source_root, PYTHONDONTWRITEBYTECODE='1')
+    # Older revisions refuse to import without a key
+    env.setdefault('OPENAI_API_KEY', 'benchmark')
+
+    timings = []
+    with tempfile.TemporaryDirectory() as workdir:  # Keep database/ and exports/ out of the repo
+        for _ in range(repeat):
+            result = subprocess.run(
+                [sys.executable, '-c', IMPORT_SNIPPET.format(module=module)],
+                cwd=workdir, env=env, capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+            timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+def measure(source_root: str, repeat: int) -> dict:
+    results = {}
+    for module in MODULES:
+        timings = time_import(source_root, module, repeat)
+        results[module] = {
+            'median_s': statistics.median(timings),
+            'min_s': min(timings),
+            'max_s': max(timings),
+            'runs': repeat
+        }
+    return results
+
+def export_revision(ref: str, target: str) -> None:
+    """Write the tree of a git revision into target"""
+    archive = subprocess.run(['git', 'archive', ref], cwd=ROOT, check=True, capture_output=True).stdout
+    subprocess.run(['tar', '-x', '-C', target], input=archive, check=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument('--ref', help="Git revision to compare against")
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args()
+
+    report = {'current': measure(ROOT, args.repeat)}
+    if args.ref:
+        with tempfile.TemporaryDirectory() as ref_root:
+            export_revision(args.ref, ref_root)
+            report[args.ref] = measure(ref_root, args.repeat)
+
+    print(f"{'module':<24}" + ''.join(f"{name:>16}" for name in report))
+    for module in MODULES:
+        print(f"{module:<24}" + ''.join(f"{report[name][module]['median_s'] * 1000:>14.1f}ms" for name in report))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+End-to-end load test of one application instance with stubbed upstream APIs.
+
+Seeds a throwaway database with synthetic users and transaction histories,
+starts the app in a subprocess pointed at the local stubs from stub_servers.py,
+then drives it with closed-loop virtual users for each concurrency level in
+--users. Every virtual user is signed in as one of the seeded users and runs a
+weighted mix of dashboard views, form-logged transactions and chat messages.
+Throughput, p50/p95/p99 latency and error rate are reported per route and stage:
+
+    python benchmarks/load_test.py --users 1,4,16,32 --duration 20 --json load.json
+    python benchmarks/load_test.py --server gunicorn --workers 4 --openai-latency 500
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_servers import start_stub_servers, stop_stub_servers, stub_environment
+from hot_paths import git_revision, seed_exchange_rates
+
+CURRENCIES = ['USD', 'USD', 'USD', 'EUR', 'GBP']
+CATEGORIES = ['food', 'transport', 'utilities', 'entertainment', 'shopping', 'other']
+
+# Scenario name -> (route label, relative weight); override weights with --mix
+SCENARIOS = {
+    'dashboard': ('GET /dashboard', 40),
+    'log_transaction': ('POST /log_transaction', 30),
+    'chat_summary': ('POST /api/chat', 10),
+    'chat_log': ('POST /api/chat', 10),
+    'chat_rate': ('POST /api/chat', 5),
+    'chat_smalltalk': ('POST /api/chat', 5)
+}
+
+CHAT_MESSAGES = {
+    'chat_summary': "Show me my monthly summary",
+    'chat_log': "I spent {amount} eur on {category} today",
+    'chat_rate': "What's the USD to EUR rate?",
+    'chat_smalltalk': "Thanks, that's all for now"
+}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def seed_users(count: int, history: int, rng: random.Random) -> list:
+    """Create `count` users with `history` transactions each over the last 90 days"""
+    from functions.db_tools import init_db, bulk_insert_transactions, remove_session
+
+    init_db()
+    seed_exchange_rates(89)
+    today = date.today()
+    user_ids = [f'load_user_{index:04d}' for index in range(count)]
+    for user_id in user_ids:
+        transactions = [{
+            'user_id': user_id,
+            'amount': round(rng.uniform(1, 300), 2),
+            'currency': rng.choice(CURRENCIES),
+            'category': rng.choice(CATEGORIES),
+            'type': 'income' if rng.random() < 0.1 else 'expense',
+            'date': today - timedelta(days=rng.randint(0, 89))
+        } for _ in range(history)]
+        if bulk_insert_transactions(transactions) is None:
+            raise RuntimeError(f"Seeding {user_id} failed")
+    remove_session()
+    return user_ids
+
+def session_cookie(secret_key: bytes, user_id: str) -> str:
+    """A Flask session cookie that signs the request in as user_id"""
+    from flask import Flask
+    from flask.sessions import SecureCookieSessionInterface
+
+    signer_app = Flask('load_test')
+    signer_app.secret_key = secret_key
+    serializer = SecureCookieSessionInterface().get_signing_serializer(signer_app)
+    return serializer.dumps({'_permanent': True, 'user_id': user_id})
+
+def start_app(server: str, workers: int, threads: int, port: int, workdir: str, env: dict) -> subprocess.Popen:
+    if server == 'gunicorn':
+        command = ['gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', str(threads),
+                   '-b', f'127.0.0.1:{port}', 'app:create_app()']
+    else:
+        command = [sys.executable, '-c',
+                   f"from app import create_app; create_app().run(host='127.0.0.1', port={port}, "
+                   f"threaded=True, debug=False, use_reloader=False)"]
+    log = open(os.path.join(workdir, 'app.log'), 'w')
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The app exited with status {process.returncode}")
+        try:
+            if requests.get(f'{base_url}/', timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"The app did not start within {timeout}s")
+
+def run_scenario(http: requests.Session, base_url: str, scenario: str, rng: random.Random,
+                 timeout: float) -> bool:
+    """Run one scenario request and return whether it succeeded"""
+    if scenario == 'dashboard':
+        response = http.get(f'{base_url}/dashboard', timeout=timeout)
+        return response.status_code == 200
+
+    if scenario == 'log_transaction':
+        response = http.post(f'{base_url}/log_transaction', timeout=timeout, data={
+            'amount': f"{rng.uniform(1, 200):.2f}",
+            'currency': rng.choice(CURRENCIES),
+            'category': rng.choice(CATEGORIES),
+            'type': 'expense',
+            'date': (date.today() - timedelta(days=rng.randint(0, 6))).isoformat()
+        })
+        return response.status_code == 200 and response.json().get('success') is True
+
+    message = CHAT_MESSAGES[scenario].format(amount=rng.randint(2, 80), category=rng.choice(CATEGORIES))
+    response = http.post(f'{base_url}/api/chat', json={'message': message}, timeout=timeout)
+    # Agent failures are reported inside a 200 response
+    return response.status_code == 200 and not response.json().get('response', '').startswith('Sorry, I encountered an error')
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def route_stats(samples: list, elapsed: float) -> dict:
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else None
+    }
+
+def run_stage(base_url: str, cookies: list, concurrency: int, duration: float, mix: dict,
+              think_time: float, timeout: float, seed: int) -> dict:
+    """Drive the app with `concurrency` closed-loop virtual users for `duration` seconds"""
+    samples = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+
+    def virtual_user(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        http = requests.Session()
+        http.headers['Cookie'] = f'session={cookies[index % len(cookies)]}'
+        while time.monotonic() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            route = SCENARIOS[scenario][0]
+            start = time.perf_counter()
+            try:
+                ok = run_scenario(http, base_url, scenario, rng, timeout)
+            except (requests.RequestException, ValueError):
+                ok = False
+            latency = time.perf_counter() - start
+            with lock:
+                samples.setdefault(route, []).append((latency, ok))
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=virtual_user, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    all_samples = [sample for route_samples in samples.values() for sample in route_samples]
+    return {
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 2),
+        'routes': {route: route_stats(route_samples, elapsed) for route, route_samples in sorted(samples.items())},
+        'total': route_stats(all_samples, elapsed)
+    }
+
+def print_stage(stage: dict) -> None:
+    print(f"\n{stage['concurrency']} concurrent users, {stage['elapsed_s']}s")
+    print(f"{'route':<24}{'requests':>10}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>9}")
+    for route, stats in [*stage['routes'].items(), ('total', stage['total'])]:
+        print(f"{route:<24}{stats['requests']:>10}{stats['throughput_rps']:>9.1f}"
+              f"{stats['p50_ms'] or 0:>8.1f}ms{stats['p95_ms'] or 0:>8.1f}ms{stats['p99_ms'] or 0:>8.1f}ms"
+              f"{stats['error_rate']:>9.1%}")
+
+def parse_mix(value: str) -> dict:
+    mix = {name: weight for name, (_, weight) in SCENARIOS.items()}
+    if value:
+        for item in value.split(','):
+            name, weight = item.split('=')
+            if name not in SCENARIOS:
+                raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+            mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', default='1,4,16', help="Comma-separated concurrency levels, one stage each")
+    parser.add_argument('--duration', type=float, default=15, help="Seconds per stage")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Mean seconds a virtual user waits between requests")
+    parser.add_argument('--mix', help="Scenario weights, e.g. dashboard=5,log_transaction=3,chat_summary=2")
+    parser.add_argument('--seed-users', type=int, default=50, help="Synthetic users to create")
+    parser.add_argument('--history', type=int, default=200, help="Seeded transactions per user")
+    parser.add_argument('--latency', type=float, default=20.0, help="Milliseconds added by the exchange rate and Binance stubs")
+    parser.add_argument('--openai-latency', type=float, default=300.0, help="Milliseconds added by the OpenAI stub")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of stub responses that fail")
+    parser.add_argument('--server', choices=['flask', 'gunicorn'], default='flask', help="How to run the app")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Client timeout per request in seconds")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.users.split(',')]
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    servers = start_stub_servers(latency=args.latency / 1000, openai_latency=args.openai_latency / 1000,
+                                 error_rate=args.error_rate, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix='finance-load-')
+    env = dict(os.environ, **stub_environment(servers))
+    env.update({
+        'PYTHONPATH': ROOT,
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        'CRYPTO_POLLER_ENABLED': 'false'
+    })
+    os.environ.update(env)
+
+    process = None
+    stages = []
+    try:
+        print(f"Seeding {args.seed_users} users x {args.history} transactions...", file=sys.stderr)
+        user_ids = seed_users(args.seed_users, args.history, rng)
+
+        # The app reads its session secret from the working directory, so cookies can be signed here
+        secret_key = os.urandom(24)
+        with open(os.path.join(workdir, '.flask_secret_key'), 'wb') as f:
+            f.write(secret_key)
+        cookies = [session_cookie(secret_key, user_id) for user_id in user_ids]
+
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        process = start_app(args.server, args.workers, args.threads, port, workdir, env)
+        wait_until_ready(base_url, process)
+
+        for level in levels:
+            print(f"Running {level} users for {args.duration}s...", file=sys.stderr)
+            stage = run_stage(base_url, cookies, level, args.duration, mix, args.think_time, args.timeout, args.seed + level)
+            stages.append(stage)
+            print_stage(stage)
+    except Exception:
+        log_path = os.path.join(workdir, 'app.log')
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                print(f"--- app.log (last lines) ---\n{''.join(f.readlines()[-20:])}", file=sys.stderr)
+        raise
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        upstream = {name: server.stats() for name, server in servers.items()}
+        stop_stub_servers(servers)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if stages:
+        best = max(stages, key=lambda stage: stage['total']['throughput_rps'])
+        print(f"\nPeak throughput {best['total']['throughput_rps']} req/s at {best['concurrency']} concurrent users")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'git_revision': git_revision(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'server': args.server,
+                    'workers': args.workers if args.server == 'gunicorn' else 1,
+                    'mix': mix,
+                    'seed_users': args.seed_users,
+                    'history': args.history,
+                    'think_time_s': args.think_time,
+                    'stub_latency_ms': args.latency,
+                    'stub_openai_latency_ms': args.openai_latency,
+                    'stub_error_rate': args.error_rate,
+                    'upstream_requests': upstream
+                },
+                'stages': stages
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
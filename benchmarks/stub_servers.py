@@ -0,0 +1,326 @@
+"""
+Local stand-ins for the exchangerate-api, Binance and OpenAI HTTP APIs.
+
+Each stub answers the endpoints the application calls with deterministic data,
+after an optional delay, and can fail a fraction of requests. Point the app at
+them with the environment variables printed on start-up, e.g.:
+
+    python benchmarks/stub_servers.py --latency 20 --openai-latency 300 --error-rate 0.01
+
+The OpenAI stub does not understand language: it picks a tool from keywords in
+the last user message ("summary", "spent", "rate", "bitcoin"), and replies with
+plain text once tool results are present or tool_choice is "none".
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+# Units of each currency per US dollar
+EXCHANGE_RATES = {
+    'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'JPY': 151.4, 'INR': 83.2,
+    'ETB': 57.1, 'CAD': 1.36, 'AUD': 1.52, 'CHF': 0.90, 'CNY': 7.23
+}
+
+TICKER_PRICES = {
+    'BTCUSDT': 65000.0, 'ETHUSDT': 3200.0, 'SOLUSDT': 150.0, 'BNBUSDT': 580.0,
+    'XRPUSDT': 0.52, 'DOGEUSDT': 0.15, 'ADAUSDT': 0.45, 'EURUSDT': 1.087,
+    'BTCEUR': 59800.0, 'ETHEUR': 2944.0, 'SOLEUR': 138.0
+}
+
+class StubServer:
+    """
+    A threaded HTTP server on 127.0.0.1 running one stub handler.
+    Every request waits `latency` seconds (plus up to `jitter`), and a fraction
+    `error_rate` of requests is answered with `error_status` instead.
+    """
+
+    def __init__(self, handler_class, port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def before_request(self) -> bool:
+        """Apply the configured delay and return True if this request should fail."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors}
+
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='stub-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real APIs
+    disable_nagle_algorithm = True  # Otherwise small responses stall on delayed ACKs
+
+    def log_message(self, format, *args):
+        pass  # Request logging would dominate benchmark output
+
+    def send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def injected_error(self) -> bool:
+        if self.server.stub.before_request():
+            self.send_json(self.server.stub.error_status, {'error': {'message': 'Injected stub error', 'type': 'server_error'}})
+            return True
+        return False
+
+class ExchangeRateHandler(_StubHandler):
+    """GET /v6/<key>/pair/<base>/<target>"""
+
+    def do_GET(self):
+        if self.injected_error():
+            return
+        match = re.fullmatch(r'/v6/[^/]+/pair/([A-Za-z]{3})/([A-Za-z]{3})', urlparse(self.path).path)
+        if not match:
+            self.send_json(404, {'result': 'error', 'error-type': 'malformed-request'})
+            return
+        base, target = match.group(1).upper(), match.group(2).upper()
+        if base not in EXCHANGE_RATES or target not in EXCHANGE_RATES:
+            self.send_json(404, {'result': 'error', 'error-type': 'unsupported-code'})
+            return
+        self.send_json(200, {
+            'result': 'success',
+            'base_code': base,
+            'target_code': target,
+            'conversion_rate': round(EXCHANGE_RATES[target] / EXCHANGE_RATES[base], 6)
+        })
+
+class BinanceHandler(_StubHandler):
+    """GET /api/v3/ticker/price?symbol=X or ?symbols=["X","Y"]"""
+
+    def do_GET(self):
+        if self.injected_error():
+            return
+        parsed = urlparse(self.path)
+        if parsed.path != '/api/v3/ticker/price':
+            self.send_json(404, {'code': -1, 'msg': 'Not found'})
+            return
+        query = parse_qs(parsed.query)
+        if 'symbols' in query:
+            symbols = json.loads(query['symbols'][0])
+            if any(symbol not in TICKER_PRICES for symbol in symbols):
+                self.send_json(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+                return
+            self.send_json(200, [{'symbol': symbol, 'price': f"{TICKER_PRICES[symbol]:.8f}"} for symbol in symbols])
+            return
+        symbol = query.get('symbol', [''])[0]
+        if symbol not in TICKER_PRICES:
+            self.send_json(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+            return
+        self.send_json(200, {'symbol': symbol, 'price': f"{TICKER_PRICES[symbol]:.8f}"})
+
+def _choose_tool_call(message: str) -> Optional[Dict]:
+    """Pick a tool and arguments for a user message from keywords"""
+    text = message.lower()
+    today = datetime.now()
+    if 'summary' in text:
+        return {'name': 'get_monthly_summary', 'arguments': {'month': today.month, 'year': today.year}}
+    if 'spent' in text or 'paid' in text:
+        amount = re.search(r'\d+(?:\.\d+)?', text)
+        category = re.search(r'\bon (\w+)', text)
+        return {'name': 'log_transaction', 'arguments': {
+            'amount': float(amount.group()) if amount else 10.0,
+            'currency': 'EUR' if 'eur' in text else 'USD',
+            'category': category.group(1) if category else 'other',
+            'type': 'expense',
+            'date': today.strftime('%Y-%m-%d')
+        }}
+    if 'rate' in text:
+        return {'name': 'get_exchange_rate', 'arguments': {'base_currency': 'USD', 'target_currency': 'EUR'}}
+    if 'bitcoin' in text or 'btc' in text:
+        return {'name': 'get_crypto_price', 'arguments': {'crypto_symbol': 'BTC'}}
+    return None
+
+class OpenAIHandler(_StubHandler):
+    """POST /v1/chat/completions, with or without stream=true"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.injected_error():
+            return
+        if urlparse(self.path).path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self.send_json(404, {'error': {'message': 'Unknown endpoint', 'type': 'invalid_request_error'}})
+            return
+
+        messages = body.get('messages', [])
+        tool_call = None
+        if body.get('tools') and body.get('tool_choice') != 'none' and messages and messages[-1].get('role') == 'user':
+            tool_call = _choose_tool_call(messages[-1].get('content') or '')
+
+        if tool_call:
+            message = {'role': 'assistant', 'content': None, 'tool_calls': [{
+                'id': f"call_{uuid.uuid4().hex[:24]}",
+                'type': 'function',
+                'function': {'name': tool_call['name'], 'arguments': json.dumps(tool_call['arguments'])}
+            }]}
+            finish_reason = 'tool_calls'
+        else:
+            message = {'role': 'assistant', 'content': "Here you go! Everything has been taken care of. 👍"}
+            finish_reason = 'stop'
+
+        prompt_tokens = len(json.dumps(messages)) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get('model', 'gpt-4o-mini')
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+
+        if body.get('stream'):
+            self._stream(completion_id, created, model, message, finish_reason,
+                         usage if (body.get('stream_options') or {}).get('include_usage') else None)
+            return
+
+        self.send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason, 'logprobs': None}],
+            'usage': usage
+        })
+
+    def _stream(self, completion_id: str, created: int, model: str, message: Dict, finish_reason: str,
+                usage: Optional[Dict]) -> None:
+        def chunk(delta: Dict, finish: Optional[str] = None, choices: bool = True) -> Dict:
+            return {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish, 'logprobs': None}] if choices else []
+            }
+
+        chunks: List[Dict] = [chunk({'role': 'assistant', 'content': ''})]
+        if message.get('tool_calls'):
+            call = message['tool_calls'][0]
+            chunks.append(chunk({'tool_calls': [{'index': 0, 'id': call['id'], 'type': 'function',
+                                                 'function': {'name': call['function']['name'], 'arguments': ''}}]}))
+            arguments = call['function']['arguments']
+            for start in range(0, len(arguments), 16):
+                chunks.append(chunk({'tool_calls': [{'index': 0, 'function': {'arguments': arguments[start:start + 16]}}]}))
+        else:
+            for word in re.findall(r'\S+\s*', message['content']):
+                chunks.append(chunk({'content': word}))
+        chunks.append(chunk({}, finish_reason))
+        if usage:
+            chunks.append({**chunk({}, choices=False), 'usage': usage})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for item in chunks:
+            self.wfile.write(f"data: {json.dumps(item)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+def start_stub_servers(latency: float = 0.0, openai_latency: float = None, jitter: float = 0.0,
+                       error_rate: float = 0.0, error_status: int = 500, seed: int = None,
+                       ports: Dict[str, int] = None) -> Dict[str, StubServer]:
+    """Start the three stubs and return them keyed by 'exchange_rate', 'binance' and 'openai'"""
+    ports = ports or {}
+    handlers = {'exchange_rate': ExchangeRateHandler, 'binance': BinanceHandler, 'openai': OpenAIHandler}
+    servers = {}
+    for name, handler in handlers.items():
+        servers[name] = StubServer(
+            handler,
+            port=ports.get(name, 0),
+            latency=openai_latency if name == 'openai' and openai_latency is not None else latency,
+            jitter=jitter,
+            error_rate=error_rate,
+            error_status=error_status,
+            seed=None if seed is None else seed + len(servers)
+        ).start()
+    return servers
+
+def stub_environment(servers: Dict[str, StubServer]) -> Dict[str, str]:
+    """Environment variables that point the application at the stubs"""
+    return {
+        'EXCHANGE_RATE_API_URL': servers['exchange_rate'].url,
+        'EXCHANGE_RATE_API_KEY': 'stub',
+        'BINANCE_API_URL': servers['binance'].url,
+        'OPENAI_BASE_URL': f"{servers['openai'].url}/v1",
+        'OPENAI_API_KEY': 'stub'
+    }
+
+def stop_stub_servers(servers: Dict[str, StubServer]) -> None:
+    for server in servers.values():
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.0, help="Milliseconds added to every response")
+    parser.add_argument('--openai-latency', type=float, help="Milliseconds for OpenAI responses (defaults to --latency)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra random milliseconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument('--error-status', type=int, default=500, help="HTTP status of injected errors")
+    parser.add_argument('--seed', type=int, help="Seed for reproducible jitter and errors")
+    parser.add_argument('--exchange-rate-port', type=int, default=8101)
+    parser.add_argument('--binance-port', type=int, default=8102)
+    parser.add_argument('--openai-port', type=int, default=8103)
+    args = parser.parse_args()
+
+    servers = start_stub_servers(
+        latency=args.latency / 1000,
+        openai_latency=None if args.openai_latency is None else args.openai_latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+        ports={'exchange_rate': args.exchange_rate_port, 'binance': args.binance_port, 'openai': args.openai_port}
+    )
+    print("Stub servers running. Point the app at them with:")
+    for name, value in stub_environment(servers).items():
+        print(f"export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stop_stub_servers(servers)
+
+if __name__ == '__main__':
+    main()
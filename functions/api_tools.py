@@ -1,29 +1,197 @@
 import requests
-from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import threading
+import time
 import os
 from dotenv import load_dotenv
+from .metrics import observe_upstream
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # API Keys (should be in .env file)
 EXCHANGE_RATE_API_KEY = os.getenv('EXCHANGE_RATE_API_KEY', 'demo')
 
-def get_exchange_rate(base_currency: str, target_currency: str) -> Optional[float]:
+# Upstream API endpoints
+EXCHANGE_RATE_API_URL = os.getenv('EXCHANGE_RATE_API_URL', 'https://v6.exchangerate-api.com')
+BINANCE_API_URL = os.getenv('BINANCE_API_URL', 'https://api.binance.com')
+BINANCE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Accept': 'application/json'
+}
+
+# Maximum concurrent Binance requests when prices are fetched pair by pair
+CRYPTO_MAX_WORKERS = int(os.getenv('CRYPTO_MAX_WORKERS', '8'))
+
+# Outbound HTTP settings
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))  # Number of hosts with pooled connections
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))  # Keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))  # Seconds
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))  # Seconds
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.3'))
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that records the duration and status of every call under an upstream name"""
+
+    def __init__(self, upstream: str, **kwargs):
+        self.upstream = upstream
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().send(request, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            observe_upstream(self.upstream, time.perf_counter() - started, status)
+
+def create_http_session(pool_connections: int = HTTP_POOL_CONNECTIONS,
+                        pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                        max_retries: int = HTTP_MAX_RETRIES,
+                        backoff_factor: float = HTTP_BACKOFF_FACTOR,
+                        upstreams: Dict[str, str] = None) -> requests.Session:
+    """
+    Create an HTTP session with keep-alive connection pooling and retry-with-backoff
+    for idempotent requests that fail to connect or return a transient error status.
+    `upstreams` maps base URLs to the names their calls are timed under; other calls count as 'other'.
+    """
+    def make_adapter(upstream: str) -> HTTPAdapter:
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+            raise_on_status=False
+        )
+        return InstrumentedHTTPAdapter(upstream, pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+    session = requests.Session()
+    other = make_adapter('other')
+    session.mount('https://', other)
+    session.mount('http://', other)
+    for base_url, upstream in (upstreams or {}).items():
+        session.mount(base_url, make_adapter(upstream))
+    return session
+
+# Shared session used for all outbound API calls
+http_session = create_http_session(upstreams={
+    EXCHANGE_RATE_API_URL: 'exchange_rate',
+    BINANCE_API_URL: 'binance'
+})
+
+# Exchange rate cache settings
+EXCHANGE_RATE_CACHE_TTL = float(os.getenv('EXCHANGE_RATE_CACHE_TTL', '600'))  # Seconds
+EXCHANGE_RATE_CACHE_SIZE = int(os.getenv('EXCHANGE_RATE_CACHE_SIZE', '256'))
+
+class RateCache:
+    """
+    Thread-safe in-process cache of exchange rates keyed by (base, target).
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `maxsize` entries are stored.
+    """
+
+    def __init__(self, ttl: float = EXCHANGE_RATE_CACHE_TTL, maxsize: int = EXCHANGE_RATE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, base_currency: str, target_currency: str) -> Optional[float]:
+        """Return the cached rate, or None if it is missing or expired."""
+        key = (base_currency.upper(), target_currency.upper())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                rate, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return rate
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, base_currency: str, target_currency: str, rate: float) -> None:
+        """Store a rate, evicting the least recently used entries if full."""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        key = (base_currency.upper(), target_currency.upper())
+        with self._lock:
+            self._entries[key] = (rate, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl
+            }
+
+# Shared cache used by get_exchange_rate (and therefore convert_to_usd and the agent)
+rate_cache = RateCache()
+
+def get_exchange_rate_cache_stats() -> Dict:
+    """Get hit/miss statistics for the exchange rate cache."""
+    return rate_cache.stats()
+
+def get_exchange_rate(base_currency: str, target_currency: str, use_cache: bool = True) -> Optional[float]:
     """
     Get the exchange rate between two currencies using exchangerate-api.com
+    Rates are served from the in-process cache when a fresh entry exists.
     """
+    if use_cache:
+        cached_rate = rate_cache.get(base_currency, target_currency)
+        if cached_rate is not None:
+            return cached_rate
+
     try:
-        url = f"https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/pair/{base_currency}/{target_currency}"
-        response = requests.get(url)
+        url = f"{EXCHANGE_RATE_API_URL}/v6/{EXCHANGE_RATE_API_KEY}/pair/{base_currency}/{target_currency}"
+        response = http_session.get(url, timeout=HTTP_TIMEOUT)
         data = response.json()
         
         if response.status_code == 200 and 'conversion_rate' in data:
-            return data['conversion_rate']
+            rate = data['conversion_rate']
+            if use_cache:
+                rate_cache.set(base_currency, target_currency, rate)
+            return rate
         else:
-            print(f"Error getting exchange rate: {data.get('error', 'Unknown error')}")
+            logger.error("Error getting exchange rate", extra={
+                'base_currency': base_currency,
+                'target_currency': target_currency,
+                'status': response.status_code,
+                'error': data.get('error', data.get('error-type', 'Unknown error'))
+            })
             return None
-    except Exception as e:
-        print(f"Error in get_exchange_rate: {e}")
+    except Exception:
+        logger.exception("Error in get_exchange_rate", extra={'base_currency': base_currency, 'target_currency': target_currency})
         return None
 
 def get_crypto_price(crypto_symbol: str) -> Optional[Dict]:
@@ -34,21 +202,16 @@ def get_crypto_price(crypto_symbol: str) -> Optional[Dict]:
         symbol = crypto_symbol.upper()
         
         # Get USD price (using USDT as proxy)
-        url_usd = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}USDT"
-        headers = {
-            'User-Agent': 'Mozilla/5.0',
-            'Accept': 'application/json'
-        }
-        
-        response_usd = requests.get(url_usd, headers=headers, timeout=10)
+        url_usd = f"{BINANCE_API_URL}/api/v3/ticker/price?symbol={symbol}USDT"
+        response_usd = http_session.get(url_usd, headers=BINANCE_HEADERS, timeout=HTTP_TIMEOUT)
         
         if response_usd.status_code == 200:
             data_usd = response_usd.json()
             usd_price = float(data_usd['price'])
             
             # Get EUR price
-            url_eur = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}EUR"
-            response_eur = requests.get(url_eur, headers=headers, timeout=10)
+            url_eur = f"{BINANCE_API_URL}/api/v3/ticker/price?symbol={symbol}EUR"
+            response_eur = http_session.get(url_eur, headers=BINANCE_HEADERS, timeout=HTTP_TIMEOUT)
             
             if response_eur.status_code == 200:
                 data_eur = response_eur.json()
@@ -63,7 +226,7 @@ def get_crypto_price(crypto_symbol: str) -> Optional[Dict]:
                 'eur': eur_price
             }
         
-        print(f"Error getting crypto price: Status {response_usd.status_code}")
+        logger.error("Error getting crypto price", extra={'symbol': symbol, 'status': response_usd.status_code})
         return {
             'symbol': symbol,
             'usd': None,
@@ -71,10 +234,54 @@ def get_crypto_price(crypto_symbol: str) -> Optional[Dict]:
             'error': f'API Error: Status {response_usd.status_code}'
         }
     except Exception as e:
-        print(f"Error in get_crypto_price: {e}")
+        logger.exception("Error in get_crypto_price", extra={'symbol': crypto_symbol.upper()})
         return {
             'symbol': crypto_symbol.upper(),
             'usd': None,
             'eur': None,
             'error': str(e)
-        } 
\ No newline at end of file
+        }
+
+def get_crypto_prices(crypto_symbols: List[str]) -> Dict[str, Dict]:
+    """
+    Get prices for several cryptocurrencies with a single Binance request.
+    All USDT pairs plus EURUSDT are fetched in one bulk ticker call and EUR prices are derived from USD.
+    If the bulk call fails (e.g. one symbol has no USDT pair), the symbols are fetched concurrently one by one.
+    Returns a dict keyed by symbol with the same entries as get_crypto_price.
+    """
+    symbols = list(dict.fromkeys(s.strip().upper() for s in crypto_symbols if s and s.strip()))
+    if not symbols:
+        return {}
+
+    pairs = [f"{symbol}USDT" for symbol in symbols] + ['EURUSDT']
+    try:
+        response = http_session.get(
+            f"{BINANCE_API_URL}/api/v3/ticker/price",
+            params={'symbols': json.dumps(pairs, separators=(',', ':'))},
+            headers=BINANCE_HEADERS,
+            timeout=HTTP_TIMEOUT
+        )
+
+        if response.status_code == 200:
+            prices = {item['symbol']: float(item['price']) for item in response.json()}
+            eur_usd = prices.get('EURUSDT')
+            results = {}
+            for symbol in symbols:
+                usd_price = prices[f"{symbol}USDT"]
+                results[symbol] = {
+                    'symbol': symbol,
+                    'usd': usd_price,
+                    # Fall back to the approximate EUR/USD rate used by get_crypto_price
+                    'eur': usd_price / eur_usd if eur_usd else usd_price * 0.92
+                }
+            return results
+
+        logger.warning("Bulk crypto price request failed, fetching symbols individually", extra={
+            'symbols': symbols,
+            'status': response.status_code
+        })
+    except Exception:
+        logger.exception("Error in get_crypto_prices, fetching symbols individually", extra={'symbols': symbols})
+
+    with ThreadPoolExecutor(max_workers=min(len(symbols), CRYPTO_MAX_WORKERS)) as executor:
+        return dict(zip(symbols, executor.map(get_crypto_price, symbols)))
@@ -1,19 +1,70 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, Date, Enum
+from sqlalchemy import create_engine, event, Column, Integer, Float, String, Date, Enum, Index, JSON, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
-from typing import List, Dict
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING
+import bisect
+import csv
+import threading
 import enum
+import logging
 import os
 from .api_tools import get_exchange_rate
+from .metrics import instrument_engine
 
-# Create database directory if it doesn't exist
-os.makedirs('database', exist_ok=True)
+# numpy is only needed for batch conversions, so it is imported on first use
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
 
 # Database setup
-DATABASE_URL = "sqlite:///database/transactions.db"
-engine = create_engine(DATABASE_URL)
+DATABASE_URL = os.getenv('DATABASE_URL', "sqlite:///database/transactions.db")
+
+# Connection pool and SQLite tuning (override in .env)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # Seconds to wait for a free connection
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))  # How long SQLite waits on a locked database
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))  # Bytes of the database file to memory-map
+
+# Historical exchange rate settings
+EXCHANGE_RATE_MAX_AGE_DAYS = int(os.getenv('EXCHANGE_RATE_MAX_AGE_DAYS', '4'))  # Furthest a stored rate may be from the transaction date
+EXCHANGE_RATE_MAX_FALLBACK_DAYS = int(os.getenv('EXCHANGE_RATE_MAX_FALLBACK_DAYS', '31'))  # Furthest any rate may be used from, with a warning
+EXCHANGE_RATE_LIVE_FALLBACK = os.getenv('EXCHANGE_RATE_LIVE_FALLBACK', 'true').lower() in ('1', 'true', 'yes')  # Fetch missing rates from the API
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=QueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+    # Pooled connections are handed to whichever thread is serving the request
+    connect_args={'check_same_thread': False, 'timeout': DB_BUSY_TIMEOUT_MS / 1000}
+)
+
+# Time every statement for the /metrics endpoint and per-request query counts
+instrument_engine(engine)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure every new SQLite connection for concurrent readers and a single writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cursor.close()
+
 SessionLocal = sessionmaker(bind=engine)
+
+# Thread-local session shared by the helpers below; released with remove_session()
+# at the end of each Flask request or agent call.
+db_session = scoped_session(SessionLocal)
+
 Base = declarative_base()
 
 class TransactionType(enum.Enum):
@@ -24,7 +75,7 @@ class Transaction(Base):
     __tablename__ = "transactions"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True)
+    user_id = Column(String)  # Indexed through the composite indexes below
     amount_usd = Column(Float)  # Amount in USD
     original_amount = Column(Float)  # Original amount in original currency
     original_currency = Column(String)  # Original currency code
@@ -32,8 +83,150 @@ class Transaction(Base):
     type = Column(String)  # Using String instead of Enum for flexibility
     date = Column(Date)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+    __table_args__ = (
+        # Date range scans per user (summaries, exports)
+        Index('ix_transactions_user_date', 'user_id', 'date'),
+        # Category/type lookups per user (category spending, grouped summaries)
+        Index('ix_transactions_user_type_category_date', 'user_id', 'type', 'category', 'date'),
+    )
+
+class MonthlyRollup(Base):
+    """Running USD totals per user, month, type and category, maintained on every insert."""
+    __tablename__ = "monthly_rollups"
+
+    user_id = Column(String, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    type = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    total_usd = Column(Float, nullable=False, default=0.0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # All users' rollups for one month (batch statements)
+        Index('ix_monthly_rollups_period', 'year', 'month'),
+    )
+
+class MonthlyCurrencyRollup(Base):
+    """Transaction counts per user, month and original currency, maintained on every insert."""
+    __tablename__ = "monthly_currency_rollups"
+
+    user_id = Column(String, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    currency = Column(String, primary_key=True)
+    transaction_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_monthly_currency_rollups_period', 'year', 'month'),
+    )
+
+class ExchangeRate(Base):
+    """USD value of one unit of a currency on a given day, used to convert transactions at their own date."""
+    __tablename__ = "exchange_rates"
+
+    date = Column(Date, primary_key=True)
+    currency = Column(String, primary_key=True)
+    usd_rate = Column(Float, nullable=False)  # USD per one unit of the currency
+
+    __table_args__ = (
+        # Nearest rate to a date for one currency
+        Index('ix_exchange_rates_currency_date', 'currency', 'date'),
+    )
+
+class BackgroundJob(Base):
+    """Status of a queued background job, shared by every worker process serving the app."""
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    queue = Column(String, nullable=False)
+    owner = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # queued, running, done or failed
+    result = Column(JSON)
+    error = Column(String)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float)
+    finished_at = Column(Float)
+
+    __table_args__ = (
+        Index('ix_jobs_queue_status', 'queue', 'status'),
+    )
+
+# Recompute both rollup tables from the raw transactions
+REBUILD_ROLLUPS_SQL = [
+    "DELETE FROM monthly_rollups",
+    """INSERT INTO monthly_rollups (user_id, year, month, type, category, total_usd, transaction_count)
+       SELECT user_id, CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER),
+              type, category, SUM(amount_usd), COUNT(*)
+       FROM transactions WHERE date IS NOT NULL
+       GROUP BY 1, 2, 3, 4, 5""",
+    "DELETE FROM monthly_currency_rollups",
+    """INSERT INTO monthly_currency_rollups (user_id, year, month, currency, transaction_count)
+       SELECT user_id, CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER),
+              original_currency, COUNT(*)
+       FROM transactions WHERE date IS NOT NULL
+       GROUP BY 1, 2, 3, 4""",
+]
+
+# Schema migrations applied in order to existing databases.
+# Each entry is (version, description, statements); the applied version is stored in PRAGMA user_version.
+MIGRATIONS = [
+    (1, "Composite indexes on transactions", [
+        "CREATE INDEX IF NOT EXISTS ix_transactions_user_date ON transactions (user_id, date)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_user_type_category_date ON transactions (user_id, type, category, date)",
+        # Covered by the leading user_id column of the composite indexes
+        "DROP INDEX IF EXISTS ix_transactions_user_id",
+    ]),
+    (2, "Backfill monthly rollups", REBUILD_ROLLUPS_SQL),
+    (3, "Period indexes on monthly rollups", [
+        "CREATE INDEX IF NOT EXISTS ix_monthly_rollups_period ON monthly_rollups (year, month)",
+        "CREATE INDEX IF NOT EXISTS ix_monthly_currency_rollups_period ON monthly_currency_rollups (year, month)",
+    ]),
+]
+
+def get_schema_version(bind=engine) -> int:
+    """Get the schema version stored in the database."""
+    with bind.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def run_migrations(bind=engine) -> int:
+    """
+    Upgrade the database schema in place by applying any pending migrations.
+    Returns the schema version after upgrading.
+    """
+    current_version = get_schema_version(bind)
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with bind.begin() as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+        logger.info("Applied migration", extra={'schema_version': version, 'description': description})
+        current_version = version
+    return current_version
+
+_db_initialized = False
+_db_init_lock = threading.Lock()
+
+def init_db(bind=engine) -> int:
+    """Create missing tables and apply pending migrations."""
+    global _db_initialized
+    with _db_init_lock:
+        if bind.url.drivername.startswith('sqlite') and bind.url.database:
+            # Create database directory if it doesn't exist
+            os.makedirs(os.path.dirname(bind.url.database) or '.', exist_ok=True)
+        Base.metadata.create_all(bind=bind)
+        version = run_migrations(bind)
+        if bind is engine:
+            _db_initialized = True
+        return version
+
+def rebuild_monthly_rollups(bind=engine) -> None:
+    """Recompute the monthly rollup tables from all stored transactions."""
+    with bind.begin() as conn:
+        for statement in REBUILD_ROLLUPS_SQL:
+            conn.exec_driver_sql(statement)
 
 def get_db():
     db = SessionLocal()
@@ -42,26 +235,292 @@ def get_db():
     finally:
         db.close()
 
-def convert_to_usd(amount: float, currency: str) -> float:
-    """Convert amount from given currency to USD."""
+def get_session():
+    """
+    Get the session for the current request or agent call.
+    The database is initialized on first use if the app did not call init_db() at startup.
+    """
+    if not _db_initialized:
+        init_db()
+    return db_session()
+
+def remove_session(exception=None) -> None:
+    """Close the current session and return its connection to the pool."""
+    db_session.remove()
+
+def _as_date(value) -> date:
+    """Normalize a transaction date (date, datetime, 'YYYY-MM-DD' or None for today) to a date"""
+    if value is None:
+        return date.today()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def store_usd_rates(rates: Iterable[Tuple[date, str, float]], batch_size: int = 5000) -> int:
+    """
+    Insert or replace (date, currency, usd_rate) rows in the exchange rate table.
+    Uses its own session and commits every batch_size rows. Returns the number of rows written.
+    """
+    if not _db_initialized:
+        init_db()
+
+    written = 0
+    db = SessionLocal()
+    try:
+        batch = []
+        for rate_date, currency, usd_rate in rates:
+            batch.append({'date': _as_date(rate_date), 'currency': currency.upper(), 'usd_rate': float(usd_rate)})
+            if len(batch) >= batch_size:
+                written += _upsert_rates(db, batch)
+                db.commit()
+                batch = []
+        if batch:
+            written += _upsert_rates(db, batch)
+            db.commit()
+        return written
+    finally:
+        db.close()
+
+def _upsert_rates(db, rows: List[Dict]) -> int:
+    stmt = sqlite_insert(ExchangeRate)
+    stmt = stmt.on_conflict_do_update(index_elements=['date', 'currency'], set_={'usd_rate': stmt.excluded.usd_rate})
+    db.execute(stmt, rows)
+    return len(rows)
+
+def load_exchange_rates(file_path: str) -> int:
+    """
+    Backfill the exchange rate table from a CSV file with a date (YYYY-MM-DD) and currency
+    column plus either usd_rate (USD per unit of the currency) or per_usd (units of the
+    currency per USD). Existing rows for the same date and currency are replaced.
+    Returns the number of rows loaded.
+    """
+    with open(file_path, newline='') as f:
+        reader = csv.DictReader(f)
+        columns = set(reader.fieldnames or [])
+        if not {'date', 'currency'} <= columns or not columns & {'usd_rate', 'per_usd'}:
+            raise ValueError("Rate file needs date, currency and usd_rate or per_usd columns")
+
+        def rows():
+            for row in reader:
+                if row.get('usd_rate'):
+                    yield row['date'], row['currency'], float(row['usd_rate'])
+                else:
+                    yield row['date'], row['currency'], 1 / float(row['per_usd'])
+
+        return store_usd_rates(rows())
+
+def _fetch_live_usd_rate(currency: str) -> Optional[float]:
+    """
+    Get today's rate from the exchange rate API and keep it in the rate table.
+    The row is committed in its own short session, so a conversion never leaves the
+    caller's session holding a write lock. Resolve rates before writing on a session
+    (as insert_transactions does) so this never waits on the caller's own lock.
+    """
+    if not EXCHANGE_RATE_LIVE_FALLBACK:
+        return None
+    rate = get_exchange_rate(currency, 'USD')
+    if rate is not None:
+        store_usd_rates([(date.today(), currency, rate)])
+    return rate
+
+def _resolve_currency_rates(db, currency: str, dates: List[date]) -> Dict[date, float]:
+    """
+    Find the USD rate of one currency for each date from the rate table.
+    The nearest stored rate within EXCHANGE_RATE_MAX_AGE_DAYS of the date is used, preferring
+    the latest one on or before it. Today's (and future) transactions use a rate stored for
+    today, fetched live if missing, as do recent dates without a close stored rate.
+    Otherwise the nearest rate within EXCHANGE_RATE_MAX_FALLBACK_DAYS is used with a warning,
+    and dates with no rate that close raise ValueError.
+    """
+    today = date.today()
+    max_age = timedelta(days=EXCHANGE_RATE_MAX_AGE_DAYS)
+    max_fallback = timedelta(days=max(EXCHANGE_RATE_MAX_AGE_DAYS, EXCHANGE_RATE_MAX_FALLBACK_DAYS))
+    dates = sorted(set(dates))
+
+    # One indexed range scan covers every rate any date in the batch may use
+    rows = db.query(ExchangeRate.date, ExchangeRate.usd_rate).filter(
+        ExchangeRate.currency == currency,
+        ExchangeRate.date >= dates[0] - max_fallback,
+        ExchangeRate.date <= dates[-1] + max_fallback
+    ).order_by(ExchangeRate.date).all()
+    stored_dates = [row.date for row in rows]
+    stored_rates = [row.usd_rate for row in rows]
+
+    live_rate = None
+    live_fetched = False
+    def live() -> Optional[float]:
+        nonlocal live_rate, live_fetched
+        if not live_fetched:
+            # A rate already stored for today is the live rate, fetched earlier
+            position = bisect.bisect_left(stored_dates, today)
+            if position < len(stored_dates) and stored_dates[position] == today:
+                live_rate = stored_rates[position]
+            else:
+                live_rate = _fetch_live_usd_rate(currency)
+            live_fetched = True
+        return live_rate
+
+    resolved = {}
+    fallback_days = []
+    for day in dates:
+        position = bisect.bisect_right(stored_dates, day)
+        if day >= today:
+            if position and stored_dates[position - 1] >= today:
+                resolved[day] = stored_rates[position - 1]
+                continue
+            if live() is not None:
+                resolved[day] = live_rate
+                continue
+        if position and day - stored_dates[position - 1] <= max_age:
+            resolved[day] = stored_rates[position - 1]
+            continue
+        if position < len(stored_dates) and stored_dates[position] - day <= max_age:
+            resolved[day] = stored_rates[position]
+            continue
+        if today - day <= max_age and live() is not None:
+            resolved[day] = live_rate
+            continue
+
+        # Nothing close by: fall back to the nearest rate within the fallback window
+        candidates = []
+        if position:
+            candidates.append((day - stored_dates[position - 1], stored_rates[position - 1]))
+        if position < len(stored_dates):
+            candidates.append((stored_dates[position] - day, stored_rates[position]))
+        if today - day <= max_fallback and live() is not None:
+            candidates.append((today - day, live_rate))
+        candidates = [candidate for candidate in candidates if candidate[0] <= max_fallback]
+        if not candidates:
+            raise ValueError(
+                f"No exchange rate for {currency} to USD within {max_fallback.days} days of {day}; "
+                "backfill historical rates with 'python -m functions.db_tools load-rates'"
+            )
+        distance, resolved[day] = min(candidates, key=lambda candidate: candidate[0])
+        fallback_days.append(distance.days)
+
+    if fallback_days:
+        logger.warning("Converted with exchange rates outside the max age", extra={
+            'currency': currency,
+            'dates': len(fallback_days),
+            'max_distance_days': max(fallback_days),
+            'max_age_days': EXCHANGE_RATE_MAX_AGE_DAYS
+        })
+    return resolved
+
+def get_usd_rates_on(keys: Iterable[Tuple[str, date]]) -> Dict[Tuple[str, date], float]:
+    """
+    Resolve the USD rate for each distinct (currency, date) pair from the local rate table,
+    with one range query per currency. See _resolve_currency_rates for how dates are matched.
+    """
+    dates_by_currency: Dict[str, List[date]] = {}
+    for currency, day in keys:
+        dates_by_currency.setdefault(currency, []).append(day)
+
+    rates = {}
+    db = get_session()
+    for currency, dates in dates_by_currency.items():
+        if currency == 'USD':
+            rates.update({('USD', day): 1.0 for day in dates})
+            continue
+        for day, rate in _resolve_currency_rates(db, currency, dates).items():
+            rates[(currency, day)] = rate
+    return rates
+
+def convert_to_usd(amount: float, currency: str, on_date=None) -> float:
+    """Convert amount from given currency to USD at the rate of on_date (default today)."""
     if currency == 'USD':
         return amount
-    
-    rate = get_exchange_rate(currency, 'USD')
-    if rate is None:
-        raise ValueError(f"Could not get exchange rate for {currency} to USD")
-    
-    return amount * rate
+
+    day = _as_date(on_date)
+    return amount * get_usd_rates_on([(currency, day)])[(currency, day)]
+
+def get_usd_rates(currencies: Iterable[str], on_date=None) -> Dict[str, float]:
+    """Resolve the USD exchange rate for each distinct currency exactly once, at on_date (default today)."""
+    day = _as_date(on_date)
+    rates = get_usd_rates_on((currency, day) for currency in set(currencies))
+    return {currency: rate for (currency, _), rate in rates.items()}
+
+def convert_batch_to_usd(amounts: Iterable[float], currencies: Iterable[str], dates: Iterable = None,
+                         rates: Dict[Tuple[str, date], float] = None) -> "np.ndarray":
+    """
+    Convert many amounts to USD at once.
+    Without dates, one rate for today is resolved per distinct currency; with dates, each
+    amount is converted at its own date with one rate lookup per distinct (currency, date),
+    unless those rates were already resolved with get_usd_rates_on and are passed as rates.
+    """
+    import numpy as np
+
+    amounts = np.asarray(list(amounts), dtype=float)
+    currencies = np.asarray(list(currencies), dtype=object)
+    if amounts.shape != currencies.shape:
+        raise ValueError("amounts and currencies must have the same length")
+
+    if dates is None:
+        unique_currencies, inverse = np.unique(currencies, return_inverse=True)
+        rates = get_usd_rates(unique_currencies)
+        rate_array = np.array([rates[currency] for currency in unique_currencies], dtype=float)
+        return amounts * rate_array[inverse]
+
+    keys = [(currency, _as_date(day)) for currency, day in zip(currencies, dates)]
+    if len(keys) != len(amounts):
+        raise ValueError("amounts and dates must have the same length")
+    if rates is None:
+        rates = get_usd_rates_on(set(keys))
+    return amounts * np.fromiter((rates[key] for key in keys), dtype=float, count=len(keys))
+
+def _update_monthly_rollups(db, transactions: List[Dict]) -> None:
+    """
+    Add newly inserted transactions to the monthly rollup tables.
+    Runs on the caller's session so the rollups commit together with the inserts.
+    """
+    category_deltas = {}
+    currency_deltas = {}
+    for trans in transactions:
+        year, month = trans['date'].year, trans['date'].month
+        key = (trans['user_id'], year, month, trans['type'], trans['category'])
+        total, count = category_deltas.get(key, (0.0, 0))
+        category_deltas[key] = (total + trans['amount_usd'], count + 1)
+
+        key = (trans['user_id'], year, month, trans['original_currency'])
+        currency_deltas[key] = currency_deltas.get(key, 0) + 1
+
+    if category_deltas:
+        stmt = sqlite_insert(MonthlyRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'year', 'month', 'type', 'category'],
+            set_={
+                'total_usd': MonthlyRollup.total_usd + stmt.excluded.total_usd,
+                'transaction_count': MonthlyRollup.transaction_count + stmt.excluded.transaction_count
+            }
+        )
+        db.execute(stmt, [
+            {'user_id': user_id, 'year': year, 'month': month, 'type': type, 'category': category,
+             'total_usd': total, 'transaction_count': count}
+            for (user_id, year, month, type, category), (total, count) in category_deltas.items()
+        ])
+
+    if currency_deltas:
+        stmt = sqlite_insert(MonthlyCurrencyRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'year', 'month', 'currency'],
+            set_={'transaction_count': MonthlyCurrencyRollup.transaction_count + stmt.excluded.transaction_count}
+        )
+        db.execute(stmt, [
+            {'user_id': user_id, 'year': year, 'month': month, 'currency': currency, 'transaction_count': count}
+            for (user_id, year, month, currency), count in currency_deltas.items()
+        ])
 
 def log_transaction(user_id: str, amount: float, category: str, type: str, date: datetime, currency: str = 'USD') -> bool:
     """
     Log a new financial transaction.
     All amounts are converted to USD before storing, but original amount and currency are preserved.
     """
-    db = next(get_db())
+    db = get_session()
     try:
         # Convert amount to USD if necessary
-        amount_usd = convert_to_usd(amount, currency)
+        amount_usd = convert_to_usd(amount, currency, date)
         
         transaction = Transaction(
             user_id=user_id,
@@ -73,70 +532,53 @@ def log_transaction(user_id: str, amount: float, category: str, type: str, date:
             date=date
         )
         db.add(transaction)
+        _update_monthly_rollups(db, [{
+            'user_id': user_id,
+            'amount_usd': amount_usd,
+            'original_currency': currency,
+            'category': category,
+            'type': type,
+            'date': date
+        }])
         db.commit()
         return True
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error logging transaction: {e}")
+        logger.exception("Error logging transaction", extra={'user_id': user_id})
         return False
 
-def get_monthly_summary(user_id: str, month: int, year: int = None) -> Dict:
-    """Get monthly financial summary."""
-    if year is None:
-        year = datetime.now().year
-        
-    db = next(get_db())
-    
-    # Get all transactions for the specified month
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1)
-    else:
-        end_date = datetime(year, month + 1, 1)
-        
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == user_id,
-        Transaction.date >= start_date,
-        Transaction.date < end_date
-    ).all()
-    
+def _build_summary(month: int, year: int, category_totals: Iterable[Tuple], currencies: List[str]) -> Dict:
+    """Assemble the summary dict from (type, category, total_usd, count) rows and the currencies used"""
     summary = {
         'period': {
             'month': month,
             'year': year,
-            'month_name': start_date.strftime('%B')
+            'month_name': datetime(year, month, 1).strftime('%B')
         },
         'total_income': 0,
         'total_expenses': 0,
         'net': 0,
         'income_by_category': {},
         'expenses_by_category': {},
-        'currencies_used': set(),
-        'transaction_count': len(transactions)
+        'currencies_used': currencies,
+        'transaction_count': 0
     }
     
-    for trans in transactions:
-        amount = trans.amount_usd
+    for trans_type, category, amount, count in category_totals:
+        amount = amount or 0
+        summary['transaction_count'] += count
         
-        if trans.type == 'income':
+        if trans_type == 'income':
             summary['total_income'] += amount
-            if trans.category not in summary['income_by_category']:
-                summary['income_by_category'][trans.category] = 0
-            summary['income_by_category'][trans.category] += amount
+            by_category = summary['income_by_category']
         else:
             summary['total_expenses'] += amount
-            if trans.category not in summary['expenses_by_category']:
-                summary['expenses_by_category'][trans.category] = 0
-            summary['expenses_by_category'][trans.category] += amount
-            
-        summary['currencies_used'].add(trans.original_currency)
+            by_category = summary['expenses_by_category']
+        by_category[category] = by_category.get(category, 0) + amount
     
     # Calculate net
     summary['net'] = summary['total_income'] - summary['total_expenses']
     
-    # Convert currencies_used from set to list for JSON serialization
-    summary['currencies_used'] = list(summary['currencies_used'])
-    
     # Sort categories by amount
     summary['income_by_category'] = dict(sorted(
         summary['income_by_category'].items(),
@@ -151,9 +593,74 @@ def get_monthly_summary(user_id: str, month: int, year: int = None) -> Dict:
     
     return summary
 
+def get_monthly_summary(user_id: str, month: int, year: int = None) -> Dict:
+    """
+    Get monthly financial summary.
+    Totals are read from the monthly rollup tables, so the cost depends on the number of categories, not transactions.
+    """
+    if year is None:
+        year = datetime.now().year
+        
+    db = get_session()
+
+    # One row per (type, category) with the summed USD amount and row count
+    category_totals = db.query(
+        MonthlyRollup.type,
+        MonthlyRollup.category,
+        MonthlyRollup.total_usd,
+        MonthlyRollup.transaction_count
+    ).filter(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.year == year,
+        MonthlyRollup.month == month
+    ).all()
+
+    currencies = db.query(MonthlyCurrencyRollup.currency).filter(
+        MonthlyCurrencyRollup.user_id == user_id,
+        MonthlyCurrencyRollup.year == year,
+        MonthlyCurrencyRollup.month == month
+    ).order_by(MonthlyCurrencyRollup.currency).all()
+    
+    return _build_summary(month, year, category_totals, [currency for (currency,) in currencies])
+
+def get_all_monthly_summaries(month: int, year: int) -> Dict[str, Dict]:
+    """
+    Get the monthly summary of every user with transactions in the given month.
+    Uses two grouped queries for all users instead of two per user.
+    """
+    db = get_session()
+
+    category_totals = {}
+    for user_id, trans_type, category, amount, count in db.query(
+        MonthlyRollup.user_id,
+        MonthlyRollup.type,
+        MonthlyRollup.category,
+        MonthlyRollup.total_usd,
+        MonthlyRollup.transaction_count
+    ).filter(
+        MonthlyRollup.year == year,
+        MonthlyRollup.month == month
+    ):
+        category_totals.setdefault(user_id, []).append((trans_type, category, amount, count))
+
+    currencies = {}
+    for user_id, currency in db.query(
+        MonthlyCurrencyRollup.user_id,
+        MonthlyCurrencyRollup.currency
+    ).filter(
+        MonthlyCurrencyRollup.year == year,
+        MonthlyCurrencyRollup.month == month
+    ).order_by(MonthlyCurrencyRollup.currency):
+        currencies.setdefault(user_id, []).append(currency)
+
+    return {
+        user_id: _build_summary(month, year, totals, currencies.get(user_id, []))
+        for user_id, totals in sorted(category_totals.items())
+    }
+
 def get_spending_by_category(user_id: str, category: str) -> float:
     """Get total spending for a specific category."""
-    db = next(get_db())
+    db = get_session()
     total = db.query(Transaction).filter(
         Transaction.user_id == user_id,
         Transaction.category == category,
@@ -164,38 +671,151 @@ def get_spending_by_category(user_id: str, category: str) -> float:
     
     return total or 0.0
 
-def bulk_insert_transactions(transactions: List[Dict]) -> bool:
-    """Insert multiple transactions at once."""
-    db = next(get_db())
+def insert_transactions(db, transactions: List[Dict], rates: Dict[Tuple[str, date], float] = None) -> List[float]:
+    """
+    Add multiple transactions and their rollups to the given session without committing,
+    so callers can insert several batches in one database transaction. Raises on failure.
+    Callers inserting several batches should resolve rates up front with get_usd_rates_on
+    and pass them, so no rate lookup (or live fetch) runs while the write lock is held.
+    Returns the USD amounts stored, in order.
+    """
+    # Convert all amounts to USD at their transaction dates, with one rate lookup per currency and date
+    currencies = [trans.get('currency', 'USD') for trans in transactions]
+    amounts_usd = convert_batch_to_usd(
+        [trans['amount'] for trans in transactions],
+        currencies,
+        [trans['date'] for trans in transactions],
+        rates
+    )
+
+    processed_transactions = []
+    for trans, currency, amount_usd in zip(transactions, currencies, amounts_usd):
+        processed_trans = {
+            'user_id': trans['user_id'],
+            'amount_usd': float(amount_usd),
+            'original_amount': trans['amount'],
+            'original_currency': currency,
+            'category': trans['category'],
+            'type': trans['type'],
+            'date': trans['date']
+        }
+        processed_transactions.append(processed_trans)
+
+    db_transactions = [Transaction(**trans) for trans in processed_transactions]
+    db.bulk_save_objects(db_transactions)
+    _update_monthly_rollups(db, processed_transactions)
+    return [trans['amount_usd'] for trans in processed_transactions]
+
+def bulk_insert_transactions(transactions: List[Dict]) -> Optional[List[float]]:
+    """Insert multiple transactions at once. Returns the USD amounts stored, or None on failure."""
+    db = get_session()
     try:
-        # Process each transaction to convert currency
-        processed_transactions = []
-        for trans in transactions:
-            currency = trans.get('currency', 'USD')
-            amount = trans['amount']
-            amount_usd = convert_to_usd(amount, currency)
-            
-            processed_trans = {
-                'user_id': trans['user_id'],
-                'amount_usd': amount_usd,
-                'original_amount': amount,
-                'original_currency': currency,
-                'category': trans['category'],
-                'type': trans['type'],
-                'date': trans['date']
-            }
-            processed_transactions.append(processed_trans)
-            
-        db_transactions = [Transaction(**trans) for trans in processed_transactions]
-        db.bulk_save_objects(db_transactions)
+        amounts_usd = insert_transactions(db, transactions)
         db.commit()
-        return True
-    except Exception as e:
+        return amounts_usd
+    except Exception:
         db.rollback()
-        print(f"Error bulk inserting transactions: {e}")
-        return False
+        logger.exception("Error bulk inserting transactions", extra={'count': len(transactions)})
+        return None
 
 def get_all_user_transactions(user_id: str) -> List[Transaction]:
     """Get all transactions for a user."""
-    db = next(get_db())
-    return db.query(Transaction).filter(Transaction.user_id == user_id).all() 
\ No newline at end of file
+    db = get_session()
+    return db.query(Transaction).filter(Transaction.user_id == user_id).all() 
+
+# Columns returned by iter_user_transactions, in order
+EXPORT_COLUMNS = ['date', 'amount_usd', 'original_amount', 'original_currency', 'category', 'type']
+
+def iter_user_transactions(user_id: str, batch_size: int = 1000) -> Iterator[Tuple]:
+    """
+    Iterate over all transactions for a user as plain row tuples (see EXPORT_COLUMNS), oldest first.
+    Rows are fetched from a server-side cursor batch_size at a time, so memory use does not grow
+    with history size. Uses its own session so it can outlive the request that started it.
+    """
+    if not _db_initialized:
+        init_db()
+    db = SessionLocal()
+    try:
+        query = db.query(*(getattr(Transaction, column) for column in EXPORT_COLUMNS)).filter(
+            Transaction.user_id == user_id
+        ).order_by(Transaction.date, Transaction.id).execution_options(yield_per=batch_size)
+        for row in query:
+            yield tuple(row)
+    finally:
+        db.close()
+
+# Background job records use their own short sessions, since jobs are
+# created, updated and polled from different threads and processes.
+JOB_COLUMNS = ['id', 'owner', 'status', 'result', 'error', 'created_at', 'started_at', 'finished_at']
+
+def save_job(queue: str, job: Dict) -> None:
+    """Store a new background job record."""
+    if not _db_initialized:
+        init_db()
+    with SessionLocal() as db:
+        db.add(BackgroundJob(queue=queue, **job))
+        db.commit()
+
+def update_job(job_id: str, **fields) -> None:
+    """Update the given fields of a background job record, if it still exists."""
+    with SessionLocal() as db:
+        db.query(BackgroundJob).filter(BackgroundJob.id == job_id).update(fields)
+        db.commit()
+
+def delete_job(job_id: str) -> None:
+    with SessionLocal() as db:
+        db.query(BackgroundJob).filter(BackgroundJob.id == job_id).delete()
+        db.commit()
+
+def get_job(queue: str, job_id: str) -> Optional[Dict]:
+    """Return a background job record as a dict, or None if it does not exist."""
+    if not _db_initialized:
+        init_db()
+    with SessionLocal() as db:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id, BackgroundJob.queue == queue).first()
+        return {column: getattr(job, column) for column in JOB_COLUMNS} if job else None
+
+def purge_jobs(queue: str, cutoff: float) -> int:
+    """
+    Delete job records of a queue that finished before cutoff, or that were created before
+    cutoff and never finished (their process stopped). Returns the number of records removed.
+    """
+    with SessionLocal() as db:
+        removed = db.query(BackgroundJob).filter(
+            BackgroundJob.queue == queue,
+            func.coalesce(BackgroundJob.finished_at, BackgroundJob.created_at) < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        return removed
+
+def count_jobs(queue: str) -> Dict[str, int]:
+    """Return the number of job records of a queue per status."""
+    if not _db_initialized:
+        init_db()
+    with SessionLocal() as db:
+        rows = db.query(BackgroundJob.status, func.count()).filter(
+            BackgroundJob.queue == queue
+        ).group_by(BackgroundJob.status).all()
+        return dict(rows)
+
+if __name__ == '__main__':
+    import argparse
+    from .log_tools import configure_logging
+
+    parser = argparse.ArgumentParser(description="Database maintenance commands")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate', help="Apply pending schema migrations")
+    subparsers.add_parser('rebuild-rollups', help="Recompute the monthly rollup tables from all transactions")
+    load_rates = subparsers.add_parser('load-rates', help="Backfill historical exchange rates from a CSV file")
+    load_rates.add_argument('file', help="CSV with date, currency and usd_rate or per_usd columns")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.command == 'migrate':
+        print(f"Database schema is at version {init_db()}")
+    elif args.command == 'rebuild-rollups':
+        rebuild_monthly_rollups()
+        print("Monthly rollups rebuilt")
+    elif args.command == 'load-rates':
+        init_db()
+        print(f"Loaded {load_exchange_rates(args.file)} exchange rates")
@@ -1,60 +1,131 @@
-import pandas as pd
-from fpdf import FPDF
-from datetime import datetime
-from typing import List, Dict
+from datetime import date, datetime
+from typing import List, Dict, Iterator, TYPE_CHECKING
+import csv
+import hashlib
+import io
+import json
+import logging
 import os
-from .db_tools import bulk_insert_transactions, get_monthly_summary, get_all_user_transactions
+import shutil
+import time
+import uuid
+from .db_tools import get_session, get_usd_rates_on, insert_transactions, get_monthly_summary, get_all_user_transactions, iter_user_transactions, EXPORT_COLUMNS
 
-def import_transactions_from_csv(user_id: str, file_path: str) -> bool:
+logger = logging.getLogger(__name__)
+
+# pandas and fpdf are slow to import, so they are loaded inside the functions that use them
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Cache of rendered summary PDFs, keyed by a digest of their content
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join('exports', 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+# Bump when the PDF layout changes so cached reports are regenerated
+PDF_LAYOUT_VERSION = 2
+
+# Number of CSV rows parsed and inserted per batch when importing
+IMPORT_CHUNK_SIZE = 10000
+
+NEW_FORMAT_COLUMNS = ['date', 'amount_usd', 'original_amount', 'original_currency', 'category', 'type']
+OLD_FORMAT_COLUMNS = ['date', 'amount', 'category', 'type']
+
+def _prepare_import_chunk(chunk: "pd.DataFrame", user_id: str, new_format: bool) -> "pd.DataFrame":
+    """
+    Normalize a chunk of CSV rows into the columns expected by insert_transactions.
+    All parsing is done column-wise instead of row by row.
+    """
+    import pandas as pd
+
+    prepared = pd.DataFrame({
+        'date': pd.to_datetime(chunk['date'], format='%Y-%m-%d').dt.date,
+        'amount': chunk['original_amount' if new_format else 'amount'].astype(float),
+        'currency': chunk['original_currency'] if new_format else 'USD',  # Default to USD for old format
+        'category': chunk['category'],
+        'type': chunk['type'].str.lower()
+    })
+    prepared.insert(0, 'user_id', user_id)
+    return prepared
+
+def _resolve_import_rates(file_path: str, chunksize: int) -> Dict:
+    """
+    Resolve the USD rate of every (currency, date) in a new-format CSV file with one pass
+    over just those two columns. Also rejects unparseable dates before anything is written.
+    """
+    import pandas as pd
+
+    keys = set()
+    columns = ['date', 'original_currency']
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, usecols=columns, dtype={'date': str}):
+        dates = pd.to_datetime(chunk['date'], format='%Y-%m-%d').dt.date
+        keys.update(zip(chunk['original_currency'], dates))
+    return get_usd_rates_on(keys)
+
+def import_transactions_from_csv(user_id: str, file_path: str, chunksize: int = IMPORT_CHUNK_SIZE) -> bool:
     """
     Import transactions from a CSV file.
     Supports both old format (date,amount,category,type) and new format (date,amount_usd,original_amount,original_currency,category,type)
+    The file is streamed in batches of `chunksize` rows and each batch is inserted as it is parsed,
+    so memory use stays bounded regardless of file size. All batches are committed together,
+    so a file that fails part way leaves nothing behind.
+    Exchange rates for the whole file are resolved in a first pass, before anything is written:
+    the database write lock is then held from the first batch until the commit, which
+    blocks other writers for as long as inserting the file takes, but never for network calls.
     """
+    import pandas as pd
+
+    db = get_session()
     try:
-        df = pd.read_csv(file_path)
-        
         # Check which format we're dealing with
-        new_format = all(col in df.columns for col in ['date', 'amount_usd', 'original_amount', 'original_currency', 'category', 'type'])
-        old_format = all(col in df.columns for col in ['date', 'amount', 'category', 'type'])
-        
+        columns = pd.read_csv(file_path, nrows=0).columns
+        new_format = all(col in columns for col in NEW_FORMAT_COLUMNS)
+        old_format = all(col in columns for col in OLD_FORMAT_COLUMNS)
         if not (new_format or old_format):
-            print("CSV file missing required columns")
+            logger.error("CSV file missing required columns", extra={'file_path': file_path, 'columns': list(columns)})
             return False
-        
-        # Convert DataFrame to list of dictionaries
-        transactions = []
-        for _, row in df.iterrows():
-            if new_format:
-                transaction = {
-                    'user_id': user_id,
-                    'date': datetime.strptime(row['date'], '%Y-%m-%d').date(),
-                    'amount': float(row['original_amount']),
-                    'currency': row['original_currency'],
-                    'category': row['category'],
-                    'type': row['type'].lower()
-                }
-            else:
-                transaction = {
-                    'user_id': user_id,
-                    'date': datetime.strptime(row['date'], '%Y-%m-%d').date(),
-                    'amount': float(row['amount']),
-                    'currency': 'USD',  # Default to USD for old format
-                    'category': row['category'],
-                    'type': row['type'].lower()
-                }
-            transactions.append(transaction)
-        
-        # Bulk insert into database
-        return bulk_insert_transactions(transactions)
-    
-    except Exception as e:
-        print(f"Error importing transactions: {e}")
+
+        # Old format files are all USD and need no rates
+        rates = _resolve_import_rates(file_path, chunksize) if new_format else None
+
+        for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype={'date': str}):
+            transactions = _prepare_import_chunk(chunk, user_id, new_format)
+
+            # Add this batch to the import's transaction
+            insert_transactions(db, transactions.to_dict('records'), rates)
+
+        db.commit()
+        return True
+
+    except Exception:
+        db.rollback()
+        logger.exception("Error importing transactions", extra={'user_id': user_id, 'file_path': file_path})
         return False
 
+def purge_old_exports(max_age_seconds: float, directory: str = 'exports') -> int:
+    """
+    Delete generated export files older than max_age_seconds.
+    Returns the number of files removed.
+    """
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass  # Removed concurrently
+    except FileNotFoundError:
+        pass
+    return removed
+
 def export_data_to_csv(user_id: str) -> str:
     """
     Export all user transactions to CSV
     """
+    import pandas as pd
+
     try:
         transactions = get_all_user_transactions(user_id)
         
@@ -80,13 +151,148 @@ def export_data_to_csv(user_id: str) -> str:
         df.to_csv(filename, index=False)
         return filename
     
-    except Exception as e:
-        print(f"Error exporting to CSV: {e}")
+    except Exception:
+        logger.exception("Error exporting to CSV", extra={'user_id': user_id})
         return None
 
+def stream_transactions_csv(user_id: str, rows_per_chunk: int = 1000) -> Iterator[str]:
+    """
+    Generate the same CSV as export_data_to_csv piece by piece, without a temp file.
+    Yields the header immediately, then one string per rows_per_chunk rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows_in_buffer = 0
+    for date, amount_usd, original_amount, original_currency, category, type in iter_user_transactions(user_id, rows_per_chunk):
+        # Round amounts for cleaner display
+        writer.writerow([date, round(amount_usd, 2), round(original_amount, 2), original_currency, category, type])
+        rows_in_buffer += 1
+        if rows_in_buffer >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows_in_buffer = 0
+
+    if rows_in_buffer:
+        yield buffer.getvalue()
+
+def render_summary_pdf(summary: Dict, path: str, generated_on: date = None) -> None:
+    """
+    Render a monthly summary (as returned by get_monthly_summary) to a PDF file at path.
+    The footer shows generated_on (default today); it has no time of day so cached reports stay accurate.
+    """
+    from fpdf import FPDF
+
+    year = summary['period']['year']
+    month = summary['period']['month']
+
+    # Create PDF
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Title
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, f'Financial Summary - {datetime(year, month, 1).strftime("%B %Y")}', ln=True, align='C')
+    pdf.ln(5)
+    
+    # Overview
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'Overview', ln=True)
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(0, 10, f'Total Income: ${summary["total_income"]:.2f}', ln=True)
+    pdf.cell(0, 10, f'Total Expenses: ${summary["total_expenses"]:.2f}', ln=True)
+    pdf.cell(0, 10, f'Net Balance: ${summary["net"]:.2f}', ln=True)
+    pdf.ln(5)
+    
+    # Income Categories
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'Income by Category', ln=True)
+    pdf.set_font('Arial', '', 12)
+    if summary['income_by_category']:
+        for category, amount in summary['income_by_category'].items():
+            pdf.cell(0, 8, f'{category}: ${amount:.2f}', ln=True)
+    else:
+        pdf.cell(0, 8, 'No income recorded for this period', ln=True)
+    pdf.ln(5)
+    
+    # Expense Categories
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'Expenses by Category', ln=True)
+    pdf.set_font('Arial', '', 12)
+    if summary['expenses_by_category']:
+        for category, amount in summary['expenses_by_category'].items():
+            pdf.cell(0, 8, f'{category}: ${amount:.2f}', ln=True)
+    else:
+        pdf.cell(0, 8, 'No expenses recorded for this period', ln=True)
+    pdf.ln(5)
+    
+    # Currencies Used
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'Currencies Used', ln=True)
+    pdf.set_font('Arial', '', 12)
+    if summary['currencies_used']:
+        currencies_text = ', '.join(summary['currencies_used'])
+        pdf.cell(0, 8, currencies_text, ln=True)
+    else:
+        pdf.cell(0, 8, 'No transactions recorded', ln=True)
+    
+    # Footer
+    pdf.ln(10)
+    pdf.set_font('Arial', 'I', 10)
+    pdf.cell(0, 10, f'Generated on {(generated_on or date.today()).strftime("%Y-%m-%d")}', ln=True, align='C')
+    pdf.output(path)
+
+def _summary_digest(user_id: str, summary: Dict, generated_on: date) -> str:
+    """Digest of everything that determines the content of a summary PDF"""
+    payload = json.dumps({
+        'layout': PDF_LAYOUT_VERSION, 'user_id': user_id, 'summary': summary, 'generated_on': generated_on
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _atomic_link(source: str, destination: str) -> None:
+    """Make destination a copy of source, replacing any existing file atomically"""
+    tmp_path = f'{destination}.{uuid.uuid4().hex}.tmp'
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)  # Hard links unsupported (e.g. across filesystems)
+        os.replace(tmp_path, destination)
+    finally:
+        # Replacing a link with another link to the same file is a no-op that leaves tmp_path behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _evict_pdf_cache(max_bytes: int = PDF_CACHE_MAX_BYTES, directory: str = PDF_CACHE_DIR, keep: str = None) -> None:
+    """Delete the least recently used cached PDFs, except keep, until the cache fits in max_bytes"""
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.pdf') and entry.path != keep:
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Evicted concurrently
+        total -= size
+
 def export_summary_to_pdf(user_id: str, month: int, year: int = None) -> str:
     """
     Generate a PDF report of monthly financial summary
+    Reports are cached under PDF_CACHE_DIR keyed by a digest of the summary and the
+    generation date, so a month whose data has not changed is served without rendering
+    again on the same day.
     """
     try:
         if year is None:
@@ -94,70 +300,33 @@ def export_summary_to_pdf(user_id: str, month: int, year: int = None) -> str:
         
         # Get monthly summary
         summary = get_monthly_summary(user_id, month, year)
-        
-        # Create PDF
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Title
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 10, f'Financial Summary - {datetime(year, month, 1).strftime("%B %Y")}', ln=True, align='C')
-        pdf.ln(5)
-        
-        # Overview
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'Overview', ln=True)
-        pdf.set_font('Arial', '', 12)
-        pdf.cell(0, 10, f'Total Income: ${summary["total_income"]:.2f}', ln=True)
-        pdf.cell(0, 10, f'Total Expenses: ${summary["total_expenses"]:.2f}', ln=True)
-        pdf.cell(0, 10, f'Net Balance: ${summary["net"]:.2f}', ln=True)
-        pdf.ln(5)
-        
-        # Income Categories
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'Income by Category', ln=True)
-        pdf.set_font('Arial', '', 12)
-        if summary['income_by_category']:
-            for category, amount in summary['income_by_category'].items():
-                pdf.cell(0, 8, f'{category}: ${amount:.2f}', ln=True)
-        else:
-            pdf.cell(0, 8, 'No income recorded for this period', ln=True)
-        pdf.ln(5)
-        
-        # Expense Categories
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'Expenses by Category', ln=True)
-        pdf.set_font('Arial', '', 12)
-        if summary['expenses_by_category']:
-            for category, amount in summary['expenses_by_category'].items():
-                pdf.cell(0, 8, f'{category}: ${amount:.2f}', ln=True)
-        else:
-            pdf.cell(0, 8, 'No expenses recorded for this period', ln=True)
-        pdf.ln(5)
-        
-        # Currencies Used
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'Currencies Used', ln=True)
-        pdf.set_font('Arial', '', 12)
-        if summary['currencies_used']:
-            currencies_text = ', '.join(summary['currencies_used'])
-            pdf.cell(0, 8, currencies_text, ln=True)
+
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        generated_on = date.today()
+        cache_path = os.path.join(PDF_CACHE_DIR, f'{_summary_digest(user_id, summary, generated_on)}.pdf')
+
+        if os.path.exists(cache_path):
+            # Mark as recently used for LRU eviction
+            os.utime(cache_path)
         else:
-            pdf.cell(0, 8, 'No transactions recorded', ln=True)
-        
-        # Footer
-        pdf.ln(10)
-        pdf.set_font('Arial', 'I', 10)
-        pdf.cell(0, 10, f'Generated on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', ln=True, align='C')
-        
+            # Render to a temporary file and move it into place so readers never see a partial PDF
+            tmp_path = f'{cache_path}.{uuid.uuid4().hex}.tmp'
+            try:
+                render_summary_pdf(summary, tmp_path, generated_on)
+                os.replace(tmp_path, cache_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            _evict_pdf_cache(keep=cache_path)
+
         # Create exports directory if it doesn't exist
         os.makedirs('exports', exist_ok=True)
         
         # Save PDF
         filename = f'exports/summary_{user_id}_{year}{month:02d}.pdf'
-        pdf.output(filename)
+        _atomic_link(cache_path, filename)
         return filename
     
-    except Exception as e:
-        print(f"Error generating PDF: {e}")
-        return None 
\ No newline at end of file
+    except Exception:
+        logger.exception("Error generating PDF", extra={'user_id': user_id, 'month': month, 'year': year})
+        return None
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+import uuid
+from .db_tools import save_job, update_job, delete_job, get_job, purge_jobs, count_jobs
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when a job queue already holds its maximum number of pending jobs."""
+
+class JobQueue:
+    """
+    Runs submitted callables on a bounded thread pool and tracks their status by job id.
+    At most `max_pending` jobs may be queued or running at once in each process; further
+    submissions are rejected with QueueFullError so callers can apply backpressure.
+    Job records are kept in the database, so any worker process can report the status of
+    a job another one is running. Finished jobs are kept for `retention` seconds so their
+    results can be collected; results must be JSON serializable.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, retention: float = 3600):
+        self.name = name
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, owner: str, fn: Callable, *args, **kwargs) -> str:
+        """Queue fn(*args, **kwargs) on behalf of owner and return the job id."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError(f"The {self.name} queue is full, try again shortly")
+
+        job_id = uuid.uuid4().hex
+        try:
+            purge_jobs(self.name, time.time() - self.retention)
+            save_job(self.name, {'id': job_id, 'owner': owner, 'status': 'queued', 'created_at': time.time()})
+        except Exception:
+            self._slots.release()
+            raise
+
+        try:
+            self._executor.submit(self._run, job_id, fn, args, kwargs)
+        except Exception:
+            delete_job(job_id)
+            self._slots.release()
+            raise
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args: tuple, kwargs: dict) -> None:
+        self._update(job_id, status='running', started_at=time.time())
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job_id, status='done', result=result, finished_at=time.time())
+        except Exception as e:
+            logger.exception("Job failed", extra={'queue': self.name, 'job_id': job_id})
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            self._slots.release()
+
+    def _update(self, job_id: str, **fields) -> None:
+        try:
+            update_job(job_id, **fields)
+        except Exception:
+            logger.exception("Error updating job", extra={'queue': self.name, 'job_id': job_id})
+
+    def get(self, job_id: str, owner: str = None) -> Optional[Dict]:
+        """Return the job, or None if it does not exist or belongs to another owner."""
+        job = get_job(self.name, job_id)
+        if job is None or (owner is not None and job['owner'] != owner):
+            return None
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of tracked jobs per status, across all processes."""
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0, **count_jobs(self.name)}
+        return {'name': self.name, 'max_pending': self.max_pending, **counts}
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and optionally wait for running ones to finish."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+# Logging settings
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # 'json' (one object per line) or 'text'
+
+# Attributes every LogRecord has; anything else was passed through `extra` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES and not key.startswith('_')}
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as single-line JSON objects, including fields passed with `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **_extra_fields(record)
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format with the `extra` fields appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = ' '.join(f'{key}={value}' for key, value in _extra_fields(record).items())
+        return f'{line} {fields}' if fields else line
+
+_configured = False
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT) -> None:
+    """Send application logs to stderr in the configured format. Safe to call more than once."""
+    global _configured
+    if _configured:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    _configured = True
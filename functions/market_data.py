@@ -0,0 +1,129 @@
+from typing import Dict, List, Optional
+import logging
+import threading
+import time
+import os
+from dotenv import load_dotenv
+from .api_tools import get_crypto_price, get_crypto_prices
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Background crypto price refresher settings
+CRYPTO_POLLER_ENABLED = os.getenv('CRYPTO_POLLER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+CRYPTO_WATCHLIST = [s.strip().upper() for s in os.getenv('CRYPTO_WATCHLIST', 'BTC,ETH').split(',') if s.strip()]
+CRYPTO_POLL_INTERVAL = float(os.getenv('CRYPTO_POLL_INTERVAL', '15'))  # Seconds between refreshes
+CRYPTO_SNAPSHOT_MAX_AGE = float(os.getenv('CRYPTO_SNAPSHOT_MAX_AGE', '30'))  # Seconds a snapshot price is served
+
+class MarketDataPoller:
+    """
+    Polls Binance for a watchlist of symbols on a background thread and keeps
+    the latest prices in an in-memory snapshot with the time they were fetched.
+    """
+
+    def __init__(self, watchlist: List[str] = None, interval: float = CRYPTO_POLL_INTERVAL):
+        self.watchlist = [s.upper() for s in (watchlist or CRYPTO_WATCHLIST)]
+        self.interval = interval
+        self._snapshot: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> None:
+        """Fetch the whole watchlist once and update the snapshot."""
+        prices = get_crypto_prices(self.watchlist)
+        fetched_at = time.time()
+        fetched_monotonic = time.monotonic()
+        with self._lock:
+            for symbol, price in prices.items():
+                # Keep the last good price rather than replacing it with an error
+                if price and price.get('usd') is not None:
+                    self._snapshot[symbol] = {
+                        'price': price,
+                        'fetched_at': fetched_at,
+                        '_fetched_monotonic': fetched_monotonic
+                    }
+
+    def get(self, symbol: str, max_age: float = CRYPTO_SNAPSHOT_MAX_AGE) -> Optional[Dict]:
+        """Return the snapshot price for a symbol if it is younger than max_age seconds."""
+        with self._lock:
+            entry = self._snapshot.get(symbol.upper())
+        if entry is None or time.monotonic() - entry['_fetched_monotonic'] > max_age:
+            return None
+        return dict(entry['price'])
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Return every snapshot price with the time it was fetched."""
+        with self._lock:
+            return {
+                symbol: {**entry['price'], 'fetched_at': entry['fetched_at']}
+                for symbol, entry in self._snapshot.items()
+            }
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Error refreshing market data", extra={'watchlist': self.watchlist})
+            self._stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        """Start polling on a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='market-data-poller', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop polling and wait for the thread to finish."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+# Poller started by start_market_data_poller (None when disabled)
+poller: Optional[MarketDataPoller] = None
+
+def start_market_data_poller(watchlist: List[str] = None, interval: float = CRYPTO_POLL_INTERVAL) -> MarketDataPoller:
+    """Start the shared background poller, replacing any running one."""
+    global poller
+    stop_market_data_poller()
+    poller = MarketDataPoller(watchlist, interval)
+    poller.start()
+    return poller
+
+def stop_market_data_poller() -> None:
+    """Stop the shared background poller if it is running."""
+    global poller
+    if poller is not None:
+        poller.stop()
+        poller = None
+
+def get_latest_crypto_price(crypto_symbol: str) -> Optional[Dict]:
+    """
+    Get a cryptocurrency price, served from the poller snapshot when it is fresh
+    and fetched live from Binance otherwise.
+    """
+    if poller is not None:
+        price = poller.get(crypto_symbol)
+        if price is not None:
+            return price
+    return get_crypto_price(crypto_symbol)
+
+def get_latest_crypto_prices(crypto_symbols: List[str]) -> Dict[str, Dict]:
+    """Get several cryptocurrency prices, fetching only the symbols missing from the snapshot."""
+    symbols = list(dict.fromkeys(s.strip().upper() for s in crypto_symbols if s and s.strip()))
+    results = {}
+    if poller is not None:
+        for symbol in symbols:
+            price = poller.get(symbol)
+            if price is not None:
+                results[symbol] = price
+
+    missing = [symbol for symbol in symbols if symbol not in results]
+    if missing:
+        results.update(get_crypto_prices(missing))
+    return {symbol: results[symbol] for symbol in symbols}
@@ -0,0 +1,181 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from contextvars import ContextVar
+import threading
+import time
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+class Histogram:
+    """Observations counted into cumulative buckets per combination of label values."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, key, ('le', _format_value(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labels, key)
+                lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests by route.',
+    ['method', 'route', 'status']
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Duration of individual SQL statements.',
+    ['operation']
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request', 'Number of SQL statements executed per HTTP request.',
+    ['route'], buckets=COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds', 'Total time spent in SQL statements per HTTP request.',
+    ['route']
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    'upstream_request_duration_seconds', 'Duration of outbound calls to external APIs, including retries.',
+    ['upstream', 'status']
+)
+TOOL_EXECUTION_DURATION = Histogram(
+    'tool_execution_duration_seconds', 'Duration of agent function dispatches.',
+    ['function', 'outcome']
+)
+
+REGISTRY = [
+    HTTP_REQUEST_DURATION,
+    DB_QUERY_DURATION,
+    DB_QUERIES_PER_REQUEST,
+    DB_TIME_PER_REQUEST,
+    UPSTREAM_REQUEST_DURATION,
+    TOOL_EXECUTION_DURATION
+]
+
+def render_prometheus() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+class RequestStats:
+    """Database work done on behalf of one HTTP request, possibly from several threads."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_query(self, seconds: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+
+# Stats of the request being handled in the current context (None outside requests)
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar('current_request_stats', default=None)
+
+def observe_query(statement: str, seconds: float) -> None:
+    """Record one SQL statement against its operation and the current request."""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+    DB_QUERY_DURATION.observe(seconds, operation=operation)
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.add_query(seconds)
+
+def instrument_engine(engine) -> None:
+    """Time every statement executed through a SQLAlchemy engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        observe_query(statement, time.perf_counter() - conn.info['query_started'].pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def _handle_error(exception_context):
+        started = exception_context.connection.info.get('query_started') if exception_context.connection else None
+        if started:
+            observe_query(exception_context.statement or '', time.perf_counter() - started.pop())
+
+def observe_upstream(upstream: str, seconds: float, status) -> None:
+    """Record one outbound API call; status is the HTTP status code or 'error'."""
+    UPSTREAM_REQUEST_DURATION.observe(seconds, upstream=upstream, status=status)
+
+def observe_tool(function_name: str, seconds: float, outcome: str) -> None:
+    """Record one agent function dispatch; outcome is 'ok' or 'error'."""
+    TOOL_EXECUTION_DURATION.observe(seconds, function=function_name, outcome=outcome)
+
+def observe_request(method: str, route: str, status: int, seconds: float, stats: Optional[RequestStats]) -> None:
+    """Record a finished HTTP request and the database work done for it."""
+    HTTP_REQUEST_DURATION.observe(seconds, method=method, route=route, status=status)
+    if stats is not None:
+        DB_QUERIES_PER_REQUEST.observe(stats.queries, route=route)
+        DB_TIME_PER_REQUEST.observe(stats.query_seconds, route=route)
@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import argparse
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from dotenv import load_dotenv
+from .db_tools import get_all_monthly_summaries, init_db
+from .file_tools import render_summary_pdf
+from .log_tools import configure_logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Month-end batch statement settings
+STATEMENTS_DIR = os.getenv('STATEMENTS_DIR', os.path.join('exports', 'statements'))
+STATEMENT_WORKERS = int(os.getenv('STATEMENT_WORKERS', str(os.cpu_count() or 1)))  # Rendering processes
+STATEMENT_CHUNK_SIZE = int(os.getenv('STATEMENT_CHUNK_SIZE', '16'))  # Statements handed to a worker at a time
+
+def statement_path(output_dir: str, user_id: str) -> str:
+    return os.path.join(output_dir, f'statement_{user_id}.pdf')
+
+def _render_statement(job: Tuple[str, Dict, str]) -> Tuple[str, Optional[str]]:
+    """Render one statement in a worker process. Returns (user_id, error or None)."""
+    user_id, summary, path = job
+    # Write to a temporary file and move it into place, so an interrupted run never
+    # leaves a partial PDF that a resumed run would mistake for a finished one
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        render_summary_pdf(summary, tmp_path)
+        os.replace(tmp_path, path)
+        return user_id, None
+    except Exception as e:
+        return user_id, str(e)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _remove_stale_tmp_files(output_dir: str) -> None:
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.tmp'):
+                os.remove(entry.path)
+
+def generate_monthly_statements(month: int, year: int, output_dir: str = None, workers: int = STATEMENT_WORKERS,
+                                force: bool = False, progress_every: int = 100) -> Dict:
+    """
+    Render a PDF statement for every user with transactions in the given month.
+    Summaries for all users are loaded with two grouped queries and rendering is spread
+    over a pool of processes. Statements already on disk are skipped unless force is set,
+    so an interrupted run can simply be started again.
+    """
+    started = time.perf_counter()
+    output_dir = output_dir or os.path.join(STATEMENTS_DIR, f'{year}{month:02d}')
+    os.makedirs(output_dir, exist_ok=True)
+    _remove_stale_tmp_files(output_dir)
+
+    summaries = get_all_monthly_summaries(month, year)
+    load_seconds = time.perf_counter() - started
+
+    jobs: List[Tuple[str, Dict, str]] = []
+    skipped = 0
+    for user_id, summary in summaries.items():
+        path = statement_path(output_dir, user_id)
+        if not force and os.path.exists(path):
+            skipped += 1
+            continue
+        jobs.append((user_id, summary, path))
+
+    logger.info("Loaded month summaries", extra={
+        'period': f'{year}-{month:02d}',
+        'users': len(summaries),
+        'to_render': len(jobs),
+        'already_done': skipped,
+        'load_seconds': round(load_seconds, 3)
+    })
+
+    rendered = 0
+    failed: Dict[str, str] = {}
+    render_started = time.perf_counter()
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+            for user_id, error in executor.map(_render_statement, jobs, chunksize=max(1, STATEMENT_CHUNK_SIZE)):
+                if error:
+                    failed[user_id] = error
+                    logger.error("Error rendering statement", extra={'user_id': user_id, 'error': error})
+                else:
+                    rendered += 1
+                done = rendered + len(failed)
+                if progress_every and done % progress_every == 0:
+                    elapsed = time.perf_counter() - render_started
+                    logger.info("Rendering statements", extra={
+                        'done': done,
+                        'total': len(jobs),
+                        'statements_per_second': round(done / elapsed, 1)
+                    })
+    render_seconds = time.perf_counter() - render_started
+
+    return {
+        'month': month,
+        'year': year,
+        'output_dir': output_dir,
+        'users': len(summaries),
+        'rendered': rendered,
+        'skipped': skipped,
+        'failed': failed,
+        'workers': workers,
+        'load_seconds': round(load_seconds, 3),
+        'render_seconds': round(render_seconds, 3),
+        'total_seconds': round(time.perf_counter() - started, 3),
+        'statements_per_second': round(rendered / render_seconds, 1) if rendered and render_seconds else 0.0
+    }
+
+if __name__ == '__main__':
+    today = datetime.now()
+    # Default to the month that just ended
+    default_month = today.month - 1 or 12
+    default_year = today.year if today.month > 1 else today.year - 1
+
+    parser = argparse.ArgumentParser(description="Render month-end PDF statements for all users")
+    parser.add_argument('--month', type=int, default=default_month)
+    parser.add_argument('--year', type=int, default=default_year)
+    parser.add_argument('--workers', type=int, default=STATEMENT_WORKERS, help="Number of rendering processes")
+    parser.add_argument('--output-dir', help="Defaults to STATEMENTS_DIR/<yyyymm>")
+    parser.add_argument('--force', action='store_true', help="Render again even if a statement already exists")
+    args = parser.parse_args()
+
+    configure_logging()
+    init_db()
+    result = generate_monthly_statements(args.month, args.year, args.output_dir, args.workers, args.force)
+    print(f"Rendered {result['rendered']} statements, skipped {result['skipped']}, failed {len(result['failed'])} "
+          f"in {result['total_seconds']:.2f}s ({result['statements_per_second']}/s with {result['workers']} workers)")
+    if result['failed']:
+        raise SystemExit(1)
@@ -1,29 +1,56 @@
-from openai import OpenAI
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import json
 import os
-from datetime import datetime, timedelta
-from functions.api_tools import get_exchange_rate, get_crypto_price
+import threading
+import time
+from datetime import datetime
+from functions.api_tools import get_exchange_rate
+from functions.market_data import get_latest_crypto_price, get_latest_crypto_prices
 from functions.db_tools import (
     log_transaction,
+    bulk_insert_transactions,
     get_monthly_summary,
-    get_spending_by_category
+    get_spending_by_category,
+    remove_session
 )
 from functions.file_tools import (
     import_transactions_from_csv,
     export_summary_to_pdf,
     export_data_to_csv
 )
+from functions.metrics import observe_tool, observe_upstream
+from llm.prompts import PROMPT_MODEL, build_system_prompt, build_response_prompt
+from llm.formatters import render_tool_results
+from llm.profiler import start_turn, finish_turn, record_model_call, record_tool, mark_rendered_locally
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
-# Initialize OpenAI client
-if not os.getenv('OPENAI_API_KEY'):
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
+# OpenAI client, created on first use by get_client()
+client = None
+_client_lock = threading.Lock()
 
-client = OpenAI()  # It will automatically use OPENAI_API_KEY from environment
+def get_client():
+    """Get the shared OpenAI client, creating it on first use"""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                if not os.getenv('OPENAI_API_KEY'):
+                    raise ValueError("OPENAI_API_KEY not found in environment variables")
+                from openai import OpenAI
+                client = OpenAI()  # It will automatically use OPENAI_API_KEY from environment
+    return client
+
+# Maximum model round trips per user message
+MAX_AGENT_STEPS = int(os.getenv('MAX_AGENT_STEPS', '4'))
+# Maximum tool calls executed concurrently within one step
+TOOL_MAX_WORKERS = int(os.getenv('TOOL_MAX_WORKERS', '4'))
+# Format well-known tool results locally instead of asking the model to write the reply
+LOCAL_RENDERING = os.getenv('AGENT_LOCAL_RENDERING', 'true').lower() in ('1', 'true', 'yes')
 
 # Define available functions
 AVAILABLE_FUNCTIONS = {
@@ -40,6 +67,10 @@ AVAILABLE_FUNCTIONS = {
                 "target_currency": {
                     "type": "string",
                     "description": "The target currency code (e.g., EUR)"
+                },
+                "amount": {
+                    "type": "number",
+                    "description": "The amount to convert, if the user asked for a conversion"
                 }
             },
             "required": ["base_currency", "target_currency"]
@@ -59,6 +90,21 @@ AVAILABLE_FUNCTIONS = {
             "required": ["crypto_symbol"]
         }
     },
+    "get_crypto_prices": {
+        "name": "get_crypto_prices",
+        "description": "Get the current prices of several cryptocurrencies at once",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "crypto_symbols": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The cryptocurrency symbols (e.g., [\"BTC\", \"ETH\"])"
+                }
+            },
+            "required": ["crypto_symbols"]
+        }
+    },
     "log_transaction": {
         "name": "log_transaction",
         "description": "Log a new financial transaction",
@@ -193,12 +239,41 @@ AVAILABLE_FUNCTIONS = {
     }
 }
 
+# Tool definitions for the chat completions tools API
+TOOLS = [{"type": "function", "function": spec} for spec in AVAILABLE_FUNCTIONS.values()]
+
+def _tool_outcome(result: Any) -> str:
+    if result is None or result is False or (isinstance(result, dict) and result.get('error')):
+        return 'failed'
+    return 'ok'
+
 def execute_function(function_name: str, arguments: Dict[str, Any]) -> Any:
-    """Execute the specified function with given arguments"""
+    """
+    Execute the specified function with given arguments.
+    The dispatch is timed per function with an outcome of 'ok', 'failed' (the function
+    reported a failure) or 'error' (it raised).
+    """
+    recorded_arguments = dict(arguments)  # Dispatch may convert values in place
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        result = _dispatch_function(function_name, arguments)
+        outcome = _tool_outcome(result)
+        return result
+    finally:
+        duration = time.perf_counter() - started
+        observe_tool(function_name, duration, outcome)
+        record_tool(function_name, recorded_arguments, duration, outcome)
+
+def _dispatch_function(function_name: str, arguments: Dict[str, Any]) -> Any:
     if function_name == "get_exchange_rate":
+        # The amount is only used to present the conversion
+        arguments = {key: value for key, value in arguments.items() if key != "amount"}
         return get_exchange_rate(**arguments)
     elif function_name == "get_crypto_price":
-        return get_crypto_price(**arguments)
+        return get_latest_crypto_price(**arguments)
+    elif function_name == "get_crypto_prices":
+        return get_latest_crypto_prices(**arguments)
     elif function_name == "log_transaction":
         # Convert date string to datetime
         arguments['date'] = datetime.strptime(arguments['date'], '%Y-%m-%d').date()
@@ -216,269 +291,330 @@ def execute_function(function_name: str, arguments: Dict[str, Any]) -> Any:
     else:
         raise ValueError(f"Unknown function: {function_name}")
 
+def prepare_arguments(function_name: str, arguments: Dict[str, Any], user_id: str, current_date: datetime) -> Dict[str, Any]:
+    """Fill in the user_id and the defaults the model may leave out"""
+    arguments = dict(arguments)
+
+    # Add user_id if the function requires it
+    if "user_id" in AVAILABLE_FUNCTIONS[function_name]["parameters"]["properties"]:
+        arguments["user_id"] = user_id
+
+    # For get_monthly_summary, ensure current month/year if not specified
+    if function_name == "get_monthly_summary":
+        arguments.setdefault("month", current_date.month)
+        arguments.setdefault("year", current_date.year)
+
+    # For log_transaction, ensure date and currency if not specified
+    if function_name == "log_transaction":
+        arguments.setdefault("date", current_date.strftime('%Y-%m-%d'))
+        arguments.setdefault("currency", "USD")
+
+    return arguments
+
+def _execute_in_worker(function_name: str, arguments: Dict[str, Any]) -> Any:
+    try:
+        return execute_function(function_name, arguments)
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        # Worker threads get their own database session, release it
+        remove_session()
+
+def log_transactions_batch(user_id: str, transactions: List[Dict[str, Any]], current_date: datetime) -> List[Dict[str, Any]]:
+    """
+    Log several transactions requested in one turn with a single bulk insert,
+    followed by one monthly summary for the current month.
+    Returns one result per transaction, in order.
+    """
+    # The whole batch is timed as one log_transaction dispatch
+    started = time.perf_counter()
+    try:
+        records = [
+            {**trans, "date": datetime.strptime(trans["date"], '%Y-%m-%d').date()}
+            for trans in transactions
+        ]
+        amounts_usd = bulk_insert_transactions(records)
+        success = amounts_usd is not None
+    except Exception as e:
+        duration = time.perf_counter() - started
+        observe_tool("log_transaction", duration, 'error')
+        record_tool("log_transaction", {"transactions": transactions}, duration, 'error')
+        return [{"transaction_success": False, "error": str(e), "original_transaction": trans} for trans in transactions]
+    duration = time.perf_counter() - started
+    observe_tool("log_transaction", duration, 'ok' if success else 'failed')
+    record_tool("log_transaction", {"transactions": transactions}, duration, 'ok' if success else 'failed')
+
+    results = [{"transaction_success": success, "original_transaction": trans} for trans in transactions]
+    if success:
+        for result, amount_usd in zip(results, amounts_usd):
+            result["amount_usd"] = round(amount_usd, 2)
+        # Show the updated summary once, after all transactions were logged
+        results[-1]["monthly_summary"] = get_monthly_summary(user_id, current_date.month, current_date.year)
+    return results
+
+def execute_tool_calls(user_id: str, tool_calls: List[Dict[str, Any]], current_date: datetime) -> List[Any]:
+    """
+    Execute the tool calls (in chat message format) from one model response.
+    All log_transaction calls are written first with one bulk insert; the remaining
+    calls are independent and run concurrently. Results are returned in call order.
+    """
+    results: List[Any] = [None] * len(tool_calls)
+    log_calls = []
+    other_calls = []
+
+    for index, tool_call in enumerate(tool_calls):
+        function_name = tool_call["function"]["name"]
+        if function_name not in AVAILABLE_FUNCTIONS:
+            results[index] = {"error": f"Unknown function: {function_name}"}
+            continue
+        try:
+            arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError as e:
+            results[index] = {"error": f"Invalid arguments: {e}"}
+            continue
+
+        arguments = prepare_arguments(function_name, arguments, user_id, current_date)
+        if function_name == "log_transaction":
+            log_calls.append((index, arguments))
+        else:
+            other_calls.append((index, function_name, arguments))
+
+    if log_calls:
+        batch_results = log_transactions_batch(user_id, [arguments for _, arguments in log_calls], current_date)
+        for (index, _), result in zip(log_calls, batch_results):
+            results[index] = result
+
+    if len(other_calls) == 1:
+        index, function_name, arguments = other_calls[0]
+        try:
+            results[index] = execute_function(function_name, arguments)
+        except Exception as e:
+            results[index] = {"error": str(e)}
+    elif other_calls:
+        with ThreadPoolExecutor(max_workers=min(len(other_calls), TOOL_MAX_WORKERS)) as executor:
+            futures = [
+                # Run in a copy of the caller's context so database work is counted against its request
+                (index, executor.submit(contextvars.copy_context().run, _execute_in_worker, function_name, arguments))
+                for index, function_name, arguments in other_calls
+            ]
+            for index, future in futures:
+                results[index] = future.result()
+
+    return results
+
+def _run_tool_round(user_id: str, content: Optional[str], tool_calls: List[Dict[str, Any]], current_date: datetime):
+    """
+    Execute one step's tool calls.
+    Returns the assistant and tool messages to append, and the locally rendered
+    reply when the results can be shown without another model call (else None).
+    """
+    round_messages = [{"role": "assistant", "content": content, "tool_calls": tool_calls}]
+    results = execute_tool_calls(user_id, tool_calls, current_date)
+    for tool_call, result in zip(tool_calls, results):
+        round_messages.append({
+            "role": "tool",
+            "tool_call_id": tool_call["id"],
+            "content": json.dumps(result, default=str)
+        })
+    reply = render_tool_results(tool_calls, results) if LOCAL_RENDERING else None
+    if reply is not None:
+        mark_rendered_locally()
+    return round_messages, reply
+
+def _system_prompt_tokens(prompt: str) -> int:
+    """Token count of today's system prompt named `prompt`, as measured when it was assembled."""
+    built = build_response_prompt() if prompt == "response" else build_system_prompt()
+    return built["token_count"]
+
+def _create_completion(prompt: str, **kwargs):
+    """
+    Create a chat completion, timing the call (to the first response bytes when streaming).
+    `prompt` names the system prompt in use ('system' or 'response') for the turn trace;
+    streamed completions are added to the trace by _stream_completion once consumed.
+    """
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = get_client().chat.completions.create(model=PROMPT_MODEL, tools=TOOLS, **kwargs)
+        status = 200
+        if not kwargs.get("stream"):
+            record_model_call(prompt, time.perf_counter() - started, response.usage,
+                              tool_choice=kwargs.get("tool_choice"), stream=False,
+                              system_prompt_tokens=_system_prompt_tokens(prompt))
+        return response
+    except Exception as e:
+        status = getattr(e, 'status_code', 'error')
+        record_model_call(prompt, time.perf_counter() - started, tool_choice=kwargs.get("tool_choice"),
+                          stream=bool(kwargs.get("stream")), error=str(e))
+        raise
+    finally:
+        observe_upstream('openai', time.perf_counter() - started, status)
+
 def process_user_message(user_id: str, message: str) -> str:
     """
-    Process user message and execute appropriate functions
+    Process user message and execute appropriate functions.
+    The model may request several tools per step; up to MAX_AGENT_STEPS round trips are made.
     """
+    trace = start_turn(user_id, message, "sync")
+    error = None
     try:
-        # Get current date information
         current_date = datetime.now()
-        current_month = current_date.month
-        current_year = current_date.year
-        current_month_name = current_date.strftime('%B')
-        yesterday = (current_date - timedelta(days=1)).strftime('%Y-%m-%d')
-        last_saturday = (current_date - timedelta(days=(current_date.weekday() + 2) % 7)).strftime('%Y-%m-%d')
-
-        # Create chat completion
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": f"""You are a helpful financial assistant. Use the available functions to help users with their financial tasks.
-
-IMPORTANT RULES FOR CURRENCIES:
-1. When logging transactions in foreign currencies:
-   - ALWAYS pass the original amount and currency to log_transaction
-   - Use the currency parameter to specify the original currency (e.g., currency='EUR' for euros)
-   - The function will handle USD conversion internally
-   - Example: For "75 euros", use amount=75, currency='EUR'
-2. Common currency codes:
-   - USD: US Dollar
-   - EUR: Euro
-   - GBP: British Pound
-   - JPY: Japanese Yen
-   - INR: Indian Rupee
-   - ETB: Ethiopian Birr
-3. Never convert amounts yourself - let the system handle all conversions
-
-IMPORTANT RULES FOR DATES:
-1. ALWAYS use 'YYYY-MM-DD' format for dates
-2. For relative dates:
-   - 'today' = '{current_date.strftime('%Y-%m-%d')}'
-   - 'yesterday' = '{yesterday}'
-   - 'last Saturday' = '{last_saturday}'
-3. Never pass datetime objects, only strings in 'YYYY-MM-DD' format
-4. For dates like 'May 15', use '{current_year}-05-15'
-
-IMPORTANT: You have direct access to the user's data through functions - NEVER ask for user_id or other information that's already provided to you.
-
-When logging transactions:
-1. ALWAYS use the log_transaction function to actually save the transaction
-2. For foreign currencies:
-   - Pass the original amount and currency to log_transaction
-   - Use the currency parameter in log_transaction (e.g., currency='EUR' for euros)
-   - The function will handle the conversion internally
-3. Use today's date ({current_date.strftime('%Y-%m-%d')}) if no date is specified
-4. Common categories: 'transport', 'food', 'utilities', 'entertainment', 'shopping', 'income', 'other'
-5. For expenses, set type='expense'. For income, set type='income'
-6. After logging, confirm the details including both original amount and USD equivalent
-
-For multiple transactions in one message:
-1. Process each transaction separately with its own log_transaction call
-2. Don't just describe what you'll do - actually call log_transaction for each one
-3. After logging all transactions, show the monthly summary once at the end
-4. Example response format:
-   ✅ Logged: 50 EUR on food (≈ $54.25 USD)
-   ✅ Logged: 30 EUR on transport (≈ $32.55 USD)
-   
-   Here's your updated monthly summary...
-
-Example transaction logging:
-User: "Spent 50 euros on food yesterday"
-Assistant actions:
-1. Call log_transaction with:
-   - amount: 50
-   - currency: 'EUR'
-   - category: 'food'
-   - type: 'expense'
-   - date: '{yesterday}'
-2. Show confirmation with both EUR and USD amounts
-3. Show monthly summary
-
-When users ask to export their transactions to CSV:
-1. Use the export_data_to_csv function immediately
-2. Tell them the path where their CSV file has been saved
-
-When users ask for their monthly summary:
-1. Call get_monthly_summary immediately with the current month ({current_month}) and year ({current_year}) if not specified
-2. Format the response like this:
-📊 Monthly Summary for {current_month_name} {current_year}
-💰 Income: $X
-💸 Expenses: $X
-💵 Net: $X
-📈 Top Income Sources:
-  - Category 1: $X
-  - Category 2: $X
-📉 Top Expenses:
-  - Category 1: $X
-  - Category 2: $X
-🔄 Currencies Used: USD, EUR, etc.
-
-After logging a transaction:
-1. Automatically show the updated monthly summary for the current month
-2. This helps users see their transaction was properly recorded
-
-Always be proactive and context-aware:
-1. Never ask for information you already have (like user_id)
-2. After any transaction is logged, show the monthly summary
-3. If a user asks about their spending, immediately show the summary
-4. Use emojis and clear formatting to make information easy to read"""},
-                {"role": "user", "content": message}
-            ],
-            functions=list(AVAILABLE_FUNCTIONS.values()),
-            function_call="auto"
-        )
+        system_prompt = build_system_prompt(current_date)
+
+        messages = [
+            {"role": "system", "content": system_prompt["content"]},
+            {"role": "user", "content": message}
+        ]
+
+        for _ in range(MAX_AGENT_STEPS):
+            response = _create_completion(
+                "system",
+                messages=messages,
+                tool_choice="auto",
+                parallel_tool_calls=True
+            )
+            response_message = response.choices[0].message
 
-        # Get the response
-        response_message = response.choices[0].message
-
-        # Check if the model wants to call a function
-        if response_message.function_call:
-            # Get function details
-            function_name = response_message.function_call.name
-            function_args = json.loads(response_message.function_call.arguments)
-            
-            # Add user_id if the function requires it
-            if "user_id" in AVAILABLE_FUNCTIONS[function_name]["parameters"]["properties"]:
-                function_args["user_id"] = user_id
-            
-            # For get_monthly_summary, ensure current month/year if not specified
-            if function_name == "get_monthly_summary":
-                if "month" not in function_args:
-                    function_args["month"] = current_month
-                if "year" not in function_args:
-                    function_args["year"] = current_year
-                    
-            # For log_transaction, ensure date and currency if not specified
-            if function_name == "log_transaction":
-                if "date" not in function_args:
-                    function_args["date"] = current_date.strftime('%Y-%m-%d')
-                if "currency" not in function_args:
-                    function_args["currency"] = "USD"
-                # Ensure date is a string
-                if isinstance(function_args["date"], datetime):
-                    function_args["date"] = function_args["date"].strftime('%Y-%m-%d')
-            
-            # Execute the function
-            function_response = execute_function(function_name, function_args)
-            
-            # If this was a log_transaction, automatically get the monthly summary
-            if function_name == "log_transaction" and function_response:
-                summary_response = execute_function("get_monthly_summary", {
-                    "user_id": user_id,
-                    "month": current_month,
-                    "year": current_year
-                })
-                function_response = {
-                    "transaction_success": function_response,
-                    "monthly_summary": summary_response,
-                    "original_transaction": {
-                        **function_args,
-                        "date": function_args["date"] if isinstance(function_args["date"], str) else function_args["date"].strftime('%Y-%m-%d')
+            # No tools requested, this is the final answer
+            if not response_message.tool_calls:
+                return response_message.content
+
+            tool_calls = [
+                {
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments
                     }
                 }
-            
-            # Create a new response incorporating the function result
-            second_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": f"""You are a helpful financial assistant. Use the available functions to help users with their financial tasks.
-
-IMPORTANT RULES FOR CURRENCIES:
-1. When logging transactions in foreign currencies:
-   - ALWAYS pass the original amount and currency to log_transaction
-   - Use the currency parameter to specify the original currency (e.g., currency='EUR' for euros)
-   - The function will handle USD conversion internally
-   - Example: For "75 euros", use amount=75, currency='EUR'
-2. Common currency codes:
-   - USD: US Dollar
-   - EUR: Euro
-   - GBP: British Pound
-   - JPY: Japanese Yen
-   - INR: Indian Rupee
-   - ETB: Ethiopian Birr
-3. Never convert amounts yourself - let the system handle all conversions
-
-IMPORTANT RULES FOR DATES:
-1. ALWAYS use 'YYYY-MM-DD' format for dates
-2. For relative dates:
-   - 'today' = '{current_date.strftime('%Y-%m-%d')}'
-   - 'yesterday' = '{yesterday}'
-   - 'last Saturday' = '{last_saturday}'
-3. Never pass datetime objects, only strings in 'YYYY-MM-DD' format
-4. For dates like 'May 15', use '{current_year}-05-15'
-
-IMPORTANT: You have direct access to the user's data through functions - NEVER ask for user_id or other information that's already provided to you.
-
-When logging transactions:
-1. ALWAYS use the log_transaction function to actually save the transaction
-2. For foreign currencies:
-   - Pass the original amount and currency to log_transaction
-   - Use the currency parameter in log_transaction (e.g., currency='EUR' for euros)
-   - The function will handle the conversion internally
-3. Use today's date ({current_date.strftime('%Y-%m-%d')}) if no date is specified
-4. Common categories: 'transport', 'food', 'utilities', 'entertainment', 'shopping', 'income', 'other'
-5. For expenses, set type='expense'. For income, set type='income'
-6. After logging, confirm the details including both original amount and USD equivalent
-
-For multiple transactions in one message:
-1. Process each transaction separately with its own log_transaction call
-2. Don't just describe what you'll do - actually call log_transaction for each one
-3. After logging all transactions, show the monthly summary once at the end
-4. Example response format:
-   ✅ Logged: 50 EUR on food (≈ $54.25 USD)
-   ✅ Logged: 30 EUR on transport (≈ $32.55 USD)
-   
-   Here's your updated monthly summary...
-
-Example transaction logging:
-User: "Spent 50 euros on food yesterday"
-Assistant actions:
-1. Call log_transaction with:
-   - amount: 50
-   - currency: 'EUR'
-   - category: 'food'
-   - type: 'expense'
-   - date: '{yesterday}'
-2. Show confirmation with both EUR and USD amounts
-3. Show monthly summary
-
-When users ask to export their transactions to CSV:
-1. Use the export_data_to_csv function immediately
-2. Tell them the path where their CSV file has been saved
-
-When users ask for their monthly summary:
-1. Call get_monthly_summary immediately with the current month ({current_month}) and year ({current_year}) if not specified
-2. Format the response like this:
-📊 Monthly Summary for {current_month_name} {current_year}
-💰 Income: $X
-💸 Expenses: $X
-💵 Net: $X
-📈 Top Income Sources:
-  - Category 1: $X
-  - Category 2: $X
-📉 Top Expenses:
-  - Category 1: $X
-  - Category 2: $X
-🔄 Currencies Used: USD, EUR, etc.
-
-After logging a transaction:
-1. Automatically show the updated monthly summary for the current month
-2. This helps users see their transaction was properly recorded
-
-Always be proactive and context-aware:
-1. Never ask for information you already have (like user_id)
-2. After any transaction is logged, show the monthly summary
-3. If a user asks about their spending, immediately show the summary
-4. Use emojis and clear formatting to make information easy to read"""},
-                    {"role": "user", "content": message},
-                    {"role": "assistant", "content": None, "function_call": response_message.function_call},
-                    {"role": "function", "name": function_name, "content": json.dumps(function_response)}
-                ]
-            )
-            
-            return second_response.choices[0].message.content
-        
-        return response_message.content
+                for tool_call in response_message.tool_calls
+            ]
+            round_messages, reply = _run_tool_round(user_id, response_message.content, tool_calls, current_date)
+            if reply is not None:
+                return reply
+            messages.extend(round_messages)
+
+        # Step budget used up: answer from the results gathered so far, without more tools
+        messages[0] = {"role": "system", "content": build_response_prompt(current_date)["content"]}
+        final_response = _create_completion(
+            "response",
+            messages=messages,
+            tool_choice="none"
+        )
+        return final_response.choices[0].message.content
+
+    except Exception as e:
+        error = str(e)
+        return f"Sorry, I encountered an error: {str(e)}"
+    finally:
+        finish_turn(trace, error)
+        # Agent calls may run outside a Flask request, so release the session here
+        remove_session()
+
+# Short descriptions shown to the user while a tool runs
+TOOL_STATUS_MESSAGES = {
+    "get_exchange_rate": "Checking exchange rates...",
+    "get_crypto_price": "Fetching crypto prices...",
+    "get_crypto_prices": "Fetching crypto prices...",
+    "log_transaction": "Logging transactions...",
+    "get_monthly_summary": "Preparing your monthly summary...",
+    "get_spending_by_category": "Analyzing your spending...",
+    "import_transactions_from_csv": "Importing transactions...",
+    "export_summary_to_pdf": "Generating PDF report...",
+    "export_data_to_csv": "Exporting transactions to CSV..."
+}
+
+def _stream_completion(messages: List[Dict], tool_choice: str, prompt: str) -> Iterator[Dict]:
+    """
+    Stream one completion. Yields {'token': text} for each content delta and finally
+    {'tool_calls': [...]} with the tool calls assembled from their streamed fragments.
+    """
+    started = time.perf_counter()
+    stream = _create_completion(
+        prompt,
+        messages=messages,
+        tool_choice=tool_choice,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+    tool_calls: Dict[int, Dict] = {}
+    usage = None
+    first_chunk_latency = None
+    for chunk in stream:
+        if first_chunk_latency is None:
+            first_chunk_latency = time.perf_counter() - started
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            yield {"token": delta.content}
+        for tool_call in delta.tool_calls or []:
+            entry = tool_calls.setdefault(tool_call.index, {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if tool_call.id:
+                entry["id"] = tool_call.id
+            if tool_call.function:
+                entry["function"]["name"] += tool_call.function.name or ""
+                entry["function"]["arguments"] += tool_call.function.arguments or ""
+
+    record_model_call(prompt, time.perf_counter() - started, usage, tool_choice=tool_choice, stream=True,
+                      first_chunk_ms=round((first_chunk_latency or 0) * 1000, 1),
+                      system_prompt_tokens=_system_prompt_tokens(prompt))
+    yield {"tool_calls": [tool_calls[index] for index in sorted(tool_calls)]}
+
+def stream_user_message(user_id: str, message: str) -> Iterator[Dict]:
+    """
+    Streaming variant of process_user_message.
+    Yields events as dicts with an 'event' of 'status' (a tool is running), 'token'
+    (a piece of the reply), 'done' or 'error', plus the event's 'data'.
+    """
+    trace = start_turn(user_id, message, "stream")
+    error = None
+    try:
+        current_date = datetime.now()
+        messages = [
+            {"role": "system", "content": build_system_prompt(current_date)["content"]},
+            {"role": "user", "content": message}
+        ]
+
+        for step in range(MAX_AGENT_STEPS + 1):
+            # Step budget used up: answer from the results gathered so far, without more tools
+            final_step = step == MAX_AGENT_STEPS
+            if final_step:
+                messages[0] = {"role": "system", "content": build_response_prompt(current_date)["content"]}
+
+            content_parts = []
+            tool_calls = []
+            for part in _stream_completion(messages, "none" if final_step else "auto", "response" if final_step else "system"):
+                if "token" in part:
+                    content_parts.append(part["token"])
+                    yield {"event": "token", "data": part["token"]}
+                else:
+                    tool_calls = part["tool_calls"]
+
+            if not tool_calls:
+                yield {"event": "done", "data": "".join(content_parts)}
+                return
+
+            for status in dict.fromkeys(TOOL_STATUS_MESSAGES.get(tool_call["function"]["name"], "Working...") for tool_call in tool_calls):
+                yield {"event": "status", "data": status}
+            round_messages, reply = _run_tool_round(user_id, "".join(content_parts) or None, tool_calls, current_date)
+            if reply is not None:
+                yield {"event": "token", "data": reply}
+                yield {"event": "done", "data": reply}
+                return
+            messages.extend(round_messages)
 
     except Exception as e:
-        return f"Sorry, I encountered an error: {str(e)}" 
\ No newline at end of file
+        error = str(e)
+        yield {"event": "error", "data": f"Sorry, I encountered an error: {str(e)}"}
+    finally:
+        finish_turn(trace, error)
+        remove_session()
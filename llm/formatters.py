@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional
+import json
+
+# Functions whose results can be turned into a reply without another model call
+RENDERABLE_FUNCTIONS = {
+    "get_monthly_summary",
+    "log_transaction",
+    "get_exchange_rate",
+    "get_crypto_price",
+    "get_crypto_prices"
+}
+
+def _money(amount: float) -> str:
+    return f"${amount:,.2f}"
+
+def format_monthly_summary(summary: Dict) -> str:
+    """Format a get_monthly_summary result in the assistant's summary layout"""
+    period = summary['period']
+    lines = [
+        f"📊 Monthly Summary for {period['month_name']} {period['year']}",
+        f"💰 Income: {_money(summary['total_income'])}",
+        f"💸 Expenses: {_money(summary['total_expenses'])}",
+        f"💵 Net: {_money(summary['net'])}",
+        "📈 Top Income Sources:"
+    ]
+    if summary['income_by_category']:
+        lines += [f"  - {category}: {_money(amount)}" for category, amount in summary['income_by_category'].items()]
+    else:
+        lines.append("  - No income recorded")
+
+    lines.append("📉 Top Expenses:")
+    if summary['expenses_by_category']:
+        lines += [f"  - {category}: {_money(amount)}" for category, amount in summary['expenses_by_category'].items()]
+    else:
+        lines.append("  - No expenses recorded")
+
+    lines.append(f"🔄 Currencies Used: {', '.join(summary['currencies_used']) or 'None'}")
+    return "\n".join(lines)
+
+def format_logged_transaction(result: Dict) -> str:
+    """Format one log_transaction result as a confirmation line"""
+    trans = result['original_transaction']
+    currency = trans.get('currency', 'USD')
+    usd = ""
+    if currency != 'USD' and result.get('amount_usd') is not None:
+        usd = f" (≈ {_money(result['amount_usd'])} USD)"
+
+    if trans.get('type') == 'income':
+        return f"✅ Logged income: {trans['amount']:,.2f} {currency} from {trans['category']}{usd} · {trans['date']}"
+    return f"✅ Logged: {trans['amount']:,.2f} {currency} on {trans['category']}{usd} · {trans['date']}"
+
+def format_exchange_rate(arguments: Dict, rate: float) -> str:
+    """Format a get_exchange_rate result, including the converted amount if one was requested"""
+    base = arguments['base_currency'].upper()
+    target = arguments['target_currency'].upper()
+    amount = arguments.get('amount')
+    if amount is not None:
+        return f"💱 {amount:,.2f} {base} = {amount * rate:,.2f} {target} (1 {base} = {rate:.4f} {target})"
+    return f"💱 1 {base} = {rate:.4f} {target}"
+
+def format_crypto_price(price: Dict) -> str:
+    """Format a get_crypto_price result"""
+    return f"🪙 {price['symbol']}: {_money(price['usd'])} USD | €{price['eur']:,.2f} EUR"
+
+def _is_crypto_price(price: Any) -> bool:
+    return isinstance(price, dict) and price.get('usd') is not None and price.get('eur') is not None
+
+def render_tool_results(tool_calls: List[Dict[str, Any]], results: List[Any]) -> Optional[str]:
+    """
+    Build the final reply for a step's tool results locally.
+    Returns None when any call is not one of RENDERABLE_FUNCTIONS or did not succeed,
+    in which case the model should write the reply instead.
+    """
+    if not tool_calls:
+        return None
+
+    logged = []
+    summaries = []
+    sections = []
+    for tool_call, result in zip(tool_calls, results):
+        function_name = tool_call["function"]["name"]
+        if function_name not in RENDERABLE_FUNCTIONS:
+            return None
+        if isinstance(result, dict) and result.get('error'):
+            return None
+
+        if function_name == "log_transaction":
+            if not result.get('transaction_success'):
+                return None
+            logged.append(format_logged_transaction(result))
+            if result.get('monthly_summary'):
+                summaries.append(result['monthly_summary'])
+        elif function_name == "get_monthly_summary":
+            summaries.append(result)
+        elif function_name == "get_exchange_rate":
+            if result is None:
+                return None
+            arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+            sections.append(format_exchange_rate(arguments, result))
+        elif function_name == "get_crypto_price":
+            if not _is_crypto_price(result):
+                return None
+            sections.append(format_crypto_price(result))
+        elif function_name == "get_crypto_prices":
+            if not result or not all(_is_crypto_price(price) for price in result.values()):
+                return None
+            sections.append("\n".join(format_crypto_price(price) for price in result.values()))
+
+    if logged:
+        sections.insert(0, "\n".join(logged))
+    if summaries:
+        # Several summary requests for the same month only need to be shown once
+        unique = {(s['period']['year'], s['period']['month']): s for s in summaries}
+        intro = "Here's your updated monthly summary:\n\n" if logged else ""
+        sections.append(intro + "\n\n".join(format_monthly_summary(s) for s in unique.values()))
+
+    return "\n\n".join(sections)
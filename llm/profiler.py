@@ -0,0 +1,249 @@
+from typing import Any, Dict, List, Optional
+from collections import deque
+from contextvars import ContextVar
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Chat turn profiling settings
+LLM_PROFILING_ENABLED = os.getenv('LLM_PROFILING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_TRACE_BUFFER_SIZE = int(os.getenv('LLM_TRACE_BUFFER_SIZE', '500'))  # Most recent turns kept in memory
+LLM_TRACE_FILE = os.getenv('LLM_TRACE_FILE', '')  # Also append every trace to this JSONL file when set
+# USD per million tokens, used to estimate the cost of each turn (defaults are gpt-4o-mini list prices)
+LLM_PROMPT_PRICE_PER_1M = float(os.getenv('LLM_PROMPT_PRICE_PER_1M', '0.15'))
+LLM_COMPLETION_PRICE_PER_1M = float(os.getenv('LLM_COMPLETION_PRICE_PER_1M', '0.60'))
+
+# Characters of the user message kept in a trace
+MESSAGE_PREVIEW_LENGTH = 200
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return (prompt_tokens * LLM_PROMPT_PRICE_PER_1M + completion_tokens * LLM_COMPLETION_PRICE_PER_1M) / 1_000_000
+
+class TurnTrace:
+    """
+    Everything that happened while answering one chat message: each model call with
+    its token usage and latency, each tool dispatch with its arguments and duration,
+    and the total wall time. Tools may record from worker threads.
+    """
+
+    def __init__(self, user_id: str, message: str, mode: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.message = message[:MESSAGE_PREVIEW_LENGTH]
+        self.mode = mode
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.model_calls: List[Dict] = []
+        self.tools: List[Dict] = []
+        self.rendered_locally = False
+        self.error: Optional[str] = None
+        self.wall_time_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add_model_call(self, prompt: str, latency: float, usage: Any = None, **fields) -> None:
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        call = {
+            'prompt': prompt,
+            'latency_ms': round(latency * 1000, 1),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cached_tokens': getattr(details, 'cached_tokens', None) or 0,
+            'usage_reported': usage is not None,
+            **fields
+        }
+        with self._lock:
+            self.model_calls.append(call)
+
+    def add_tool(self, function_name: str, arguments: Dict, duration: float, outcome: str) -> None:
+        tool = {
+            'function': function_name,
+            'arguments': arguments,
+            'duration_ms': round(duration * 1000, 1),
+            'outcome': outcome
+        }
+        with self._lock:
+            self.tools.append(tool)
+
+    def finish(self, error: str = None) -> None:
+        self.error = error
+        self.wall_time_ms = round((time.perf_counter() - self._started) * 1000, 1)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            model_calls = list(self.model_calls)
+            tools = list(self.tools)
+        prompt_tokens = sum(call['prompt_tokens'] for call in model_calls)
+        completion_tokens = sum(call['completion_tokens'] for call in model_calls)
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'mode': self.mode,
+            'message': self.message,
+            'started_at': self.started_at,
+            'wall_time_ms': self.wall_time_ms,
+            'model_time_ms': round(sum(call['latency_ms'] for call in model_calls), 1),
+            'tool_time_ms': round(sum(tool['duration_ms'] for tool in tools), 1),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'estimated_cost_usd': round(estimate_cost(prompt_tokens, completion_tokens), 8),
+            'model_calls': model_calls,
+            'tools': tools,
+            'rendered_locally': self.rendered_locally,
+            'error': self.error
+        }
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def _distribution(values: List[float]) -> Dict:
+    values = sorted(values)
+    if not values:
+        return {'mean': None, 'p50': None, 'p95': None, 'max': None}
+    return {
+        'mean': round(sum(values) / len(values), 1),
+        'p50': _percentile(values, 0.50),
+        'p95': _percentile(values, 0.95),
+        'max': values[-1]
+    }
+
+class TraceStore:
+    """Keeps the most recent turn traces in a ring buffer and optionally appends them to a JSONL file."""
+
+    def __init__(self, maxlen: int = LLM_TRACE_BUFFER_SIZE, sink_path: str = LLM_TRACE_FILE):
+        self._traces = deque(maxlen=maxlen)
+        self.sink_path = sink_path
+        self._lock = threading.Lock()
+        self._sink_lock = threading.Lock()
+
+    def add(self, trace: Dict) -> None:
+        with self._lock:
+            self._traces.append(trace)
+        if self.sink_path:
+            try:
+                line = json.dumps(trace, default=str) + '\n'
+                with self._sink_lock, open(self.sink_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except Exception:
+                logger.exception("Error writing LLM trace", extra={'trace_file': self.sink_path})
+
+    def recent(self, limit: int = 50, user_id: str = None) -> List[Dict]:
+        """Return the newest traces first, optionally only those of one user."""
+        with self._lock:
+            traces = list(self._traces)
+        if user_id is not None:
+            traces = [trace for trace in traces if trace['user_id'] == user_id]
+        return traces[::-1][:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+    def summary(self) -> Dict:
+        """Aggregate the buffered traces by prompt and by tool."""
+        with self._lock:
+            traces = list(self._traces)
+
+        by_prompt: Dict[str, Dict] = {}
+        by_tool: Dict[str, Dict] = {}
+        model_latencies = []
+        for trace in traces:
+            for call in trace['model_calls']:
+                model_latencies.append(call['latency_ms'])
+                stats = by_prompt.setdefault(call['prompt'], {
+                    'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0,
+                    'system_prompt_tokens': None, 'latencies': []
+                })
+                stats['calls'] += 1
+                # Measured locally for the prompt in use, latest value wins
+                stats['system_prompt_tokens'] = call.get('system_prompt_tokens', stats['system_prompt_tokens'])
+                stats['prompt_tokens'] += call['prompt_tokens']
+                stats['completion_tokens'] += call['completion_tokens']
+                stats['cached_tokens'] += call['cached_tokens']
+                stats['latencies'].append(call['latency_ms'])
+            for tool in trace['tools']:
+                stats = by_tool.setdefault(tool['function'], {'calls': 0, 'failures': 0, 'durations': []})
+                stats['calls'] += 1
+                stats['failures'] += tool['outcome'] != 'ok'
+                stats['durations'].append(tool['duration_ms'])
+
+        prompts = {}
+        for prompt, stats in by_prompt.items():
+            latencies = stats.pop('latencies')
+            prompts[prompt] = {
+                **stats,
+                'estimated_cost_usd': round(estimate_cost(stats['prompt_tokens'], stats['completion_tokens']), 6),
+                'latency_ms': _distribution(latencies)
+            }
+        tools = {}
+        for function_name, stats in sorted(by_tool.items(), key=lambda item: -sum(item[1]['durations'])):
+            durations = stats.pop('durations')
+            tools[function_name] = {**stats, 'total_ms': round(sum(durations), 1), 'duration_ms': _distribution(durations)}
+
+        prompt_tokens = sum(trace['prompt_tokens'] for trace in traces)
+        completion_tokens = sum(trace['completion_tokens'] for trace in traces)
+        return {
+            'turns': len(traces),
+            'errors': sum(1 for trace in traces if trace['error']),
+            'rendered_locally': sum(1 for trace in traces if trace['rendered_locally']),
+            'wall_time_ms': _distribution([trace['wall_time_ms'] for trace in traces]),
+            'model_calls': len(model_latencies),
+            'model_latency_ms': _distribution(model_latencies),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'estimated_cost_usd': round(estimate_cost(prompt_tokens, completion_tokens), 6),
+            'by_prompt': prompts,
+            'by_tool': tools
+        }
+
+# Traces of recent chat turns
+trace_store = TraceStore()
+
+# Trace of the chat turn being processed in the current context (None when not profiling)
+current_trace: ContextVar[Optional[TurnTrace]] = ContextVar('current_trace', default=None)
+
+def start_turn(user_id: str, message: str, mode: str) -> Optional[TurnTrace]:
+    """Begin tracing a chat turn in the current context."""
+    if not LLM_PROFILING_ENABLED:
+        return None
+    trace = TurnTrace(user_id, message, mode)
+    current_trace.set(trace)
+    return trace
+
+def finish_turn(trace: Optional[TurnTrace], error: str = None) -> None:
+    """Stop tracing the current chat turn and store its trace."""
+    current_trace.set(None)
+    if trace is None:
+        return
+    trace.finish(error)
+    trace_store.add(trace.to_dict())
+
+def record_model_call(prompt: str, latency: float, usage: Any = None, **fields) -> None:
+    """Record a completion against the current turn, if one is being traced."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_model_call(prompt, latency, usage, **fields)
+
+def mark_rendered_locally() -> None:
+    """Note that the current turn's reply was formatted without a final model call."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.rendered_locally = True
+
+def record_tool(function_name: str, arguments: Dict, duration: float, outcome: str) -> None:
+    """Record a tool dispatch against the current turn, if one is being traced."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_tool(function_name, arguments, duration, outcome)